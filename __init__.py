@@ -1,45 +1,55 @@
 # __init__.py
-
+#
+# Importing mgproc is cheap: the modules of the package are only imported
+# once one of their names is accessed (e.g. mgproc.metrics_from_file), and
+# no user code is executed until a metric needs it (see plugins.py).
+#
+# For interactive use, run `python3 -i __init__.py`; this imports all
+# modules into the shell right away.
+
+import importlib
 import os
-import re
-from pprint import pprint
-
-from io_tree import *
-from tree_values import *
-from metrics import *
-from comparisons import *
-from helpers import *
-
-
-def load_user_code(user_file: str=None,
-                   user_dir: str='./usercode'):
-    """
-    Load user-defined code.
-
-    The user may want to define new tree traversals or new functions to be used
-    by metrics. To simplify this, users can just add Python files to a user_dir
-    folder.
-
-    Parameters
-    ----------
-    user_file: str
-        specific file to be loaded; by default, all files are loaded
-    user_dir: str
-        folder from which .py files are to be loaded; defaults to './usercode'
-    """
-    if user_file:
-        user_files = [os.path.join(user_dir, user_file)]
-    else:
-        user_files = [os.path.join(user_dir, user_file)
-                      for user_file in os.listdir(user_dir)
-                      if user_file.endswith('py')]
-
-    # execute code in each file and
-    # add it to list of globally accessible functions
-    for user_file in user_files:
-        with open(user_file, 'r') as code_file:
-            code = code_file.read()
-            code_file.close()
-            exec(code, globals())
-
-load_user_code()
+import sys
+
+# the modules import each other by their plain names, so make sure
+# they can be found no matter what the current directory is
+_package_dir = os.path.dirname(os.path.abspath(__file__))
+if _package_dir not in sys.path:
+    sys.path.insert(0, _package_dir)
+
+# modules whose public names are available from the package;
+# earlier modules take precedence
+_modules = ['helpers', 'comparisons', 'metrics', 'tree_values', 'io_tree',
+            'tree_files', 'plugins', 'jobs', 'engine', 'footprint']
+
+
+def __getattr__(name: str):
+    """Import modules on demand and look up name in them"""
+    if name.startswith('_'):
+        raise AttributeError(name)
+    for module_name in _modules:
+        if name == module_name:
+            return importlib.import_module(module_name)
+        module = importlib.import_module(module_name)
+        if name in getattr(module, '__all__', dir(module)):
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+    raise AttributeError("module 'mgproc' has no attribute '{0}'".format(name))
+
+
+def load_user_code(user_file: str=None, user_dir: str=None) -> dict:
+    """Load user-defined code; see plugins.load_user_code"""
+    plugins = importlib.import_module('plugins')
+    return plugins.load_user_code(user_file=user_file, user_dir=user_dir)
+
+
+if __name__ == '__main__':
+    from pprint import pprint
+    from io_tree import *
+    from tree_values import *
+    from metrics import *
+    from comparisons import *
+    from helpers import *
+    from tree_files import *
+    globals().update(load_user_code())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This file defines the command-line interface of mgproc:
+#
+#   python3 cli.py run --compare FILE --metrics FILE [--ranks K] ...
+#   python3 cli.py batch MANIFEST [--workers N] ...
+#   python3 cli.py export FOLDER [--output-dir DIR] [--workers N] ...
+#
+# The run command sweeps over all RankedMetrics without ever asking for
+# input. The RankedMetrics are split into shards of fixed size, following
+# the order of _construct_ranked_metric. After each shard, its results and
+# the overall progress are saved in a checkpoint directory. If a run is
+# interrupted, rerunning the same command resumes after the last completed
+# shard.
+#
+# The batch command runs all jobs in a *.jobs file (see jobs.py).
+# The export command writes forest code for all trees in a folder
+# (see tree_files.export_folder).
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+from metrics import base_metrics_from_file, ranked_metrics
+from comparisons import comparisons_from_file, _write_rows, _external_sort
+from jobs import run_jobs
+from footprint import shard_size as budget_shard_size
+from tree_files import export_folder
+
+
+#################
+#  Checkpoints  #
+#################
+
+def _load_state(checkpoint: str, config: dict) -> dict:
+    """Load progress from checkpoint directory, or start from scratch"""
+    state_file = os.path.join(checkpoint, 'state.json')
+    fresh = {'config': config, 'completed': [], 'counts': {}}
+
+    if not os.path.exists(state_file):
+        return fresh
+
+    with open(state_file, 'r') as f:
+        state = json.load(f)
+    if state['config'] != config:
+        message = 'Checkpoint {0} belongs to a different sweep;\n\
+delete it or specify another checkpoint directory'
+        raise Exception(message.format(checkpoint))
+
+    # only trust shards whose result files actually exist; the counts of
+    # all other shards are dropped, since those shards are run again
+    counts = state.get('counts', {})
+    state['completed'] = [number for number in state['completed']
+                          if str(number) in counts and
+                          os.path.exists(_shard_file(checkpoint, number))]
+    state['counts'] = {str(number): counts[str(number)]
+                       for number in state['completed']}
+    return state
+
+
+def _totals(state: dict) -> dict:
+    """Sum up the counts of all completed shards"""
+    totals = {'success': 0, 'tie': 0, 'failure': 0}
+    for counts in state['counts'].values():
+        for subtype, count in zip(['success', 'tie', 'failure'], counts):
+            totals[subtype] += count
+    return totals
+
+
+def _save_state(checkpoint: str, state: dict):
+    """Atomically write progress to checkpoint directory"""
+    state_file = os.path.join(checkpoint, 'state.json')
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def _shard_file(checkpoint: str, number: int) -> str:
+    return os.path.join(checkpoint, 'shard-{0:06d}.csv'.format(number))
+
+
+def _shard_rows(checkpoint: str, shards: int) -> 'iterable':
+    """Read rows of all shard files in order"""
+    for number in range(shards):
+        with open(_shard_file(checkpoint, number), 'r', newline='') as f:
+            yield from csv.reader(f)
+
+
+###########
+#  Sweep  #
+###########
+
+def run_sweep(compare: str, metrics: str, ranks: int=1,
+              directory: str=None, output: str=None,
+              checkpoint: str=None, shard_size: int=10000,
+              fmt: str=None, sort: bool=False, budget: int=None) -> dict:
+    """
+    Compare all RankedMetrics in shards, with resumable checkpoints.
+
+    Parameters
+    ----------
+    compare: str
+        path to *.compare file
+    metrics: str
+        path to *.metrics file
+    ranks: int
+        number of BaseMetrics per RankedMetric
+    directory: str
+        directory of the trees referenced in the *.compare file
+    output: str
+        file for the final table; by default, a streamed org table
+        <compare>_<metrics>_<ranks>.org in the current directory
+    checkpoint: str
+        directory for checkpoints; defaults to output + '.checkpoint'
+    shard_size: int
+        number of RankedMetrics per shard
+    fmt: str
+        orgtbl or csv; by default, csv if output ends in .csv
+    sort: bool
+        sort the rows of the final table
+    budget: int
+        memory in bytes a shard may take up; if specified, the shard size
+        is computed from it (see footprint.shard_size)
+
+    Returns
+    -------
+    dict
+        number of successful, tie-ing, and failing RankedMetrics
+    """
+    if not output:
+        output = '{0}_{1}_{2}.org'.format(
+            os.path.basename(compare).replace('.compare', ''),
+            os.path.basename(metrics).replace('.metrics', ''),
+            ranks)
+    if not checkpoint:
+        checkpoint = output + '.checkpoint'
+    if not fmt:
+        fmt = 'csv' if output.endswith('.csv') else 'orgtbl'
+    os.makedirs(checkpoint, exist_ok=True)
+
+    base_metrics = base_metrics_from_file(metrics)
+    comp = comparisons_from_file(compare, directory=directory)
+    total = len(base_metrics) ** ranks
+    if budget:
+        shard_size = budget_shard_size(len(base_metrics), ranks,
+                                       len(comp.comparisons), budget)
+    shards = -(-total // shard_size)
+
+    config = {'compare': os.path.abspath(compare),
+              'metrics': os.path.abspath(metrics),
+              'directory': os.path.abspath(directory) if directory else None,
+              'ranks': ranks, 'shard_size': shard_size, 'total': total}
+    state = _load_state(checkpoint, config)
+    if state['completed']:
+        print('Resuming from checkpoint: {0} of {1} shards done'.format(
+            len(state['completed']), shards))
+
+    for number in range(shards):
+        if number in state['completed']:
+            continue
+
+        comp.metrics = list(ranked_metrics(base_metrics, ranks=ranks,
+                                           start=number * shard_size,
+                                           stop=(number + 1) * shard_size,
+                                           compact=True))
+        for comparison in comp.comparisons:
+            comparison.reset()
+        comp.compare()
+
+        # write results of shard before recording it as completed
+        shard_file = _shard_file(checkpoint, number)
+        with open(shard_file + '.tmp', 'w', newline='') as f:
+            csv.writer(f).writerows(comp._rows())
+        os.replace(shard_file + '.tmp', shard_file)
+
+        state['completed'].append(number)
+        state['counts'][str(number)] = [len(comp.success), len(comp.tie),
+                                        len(comp.failure)]
+        _save_state(checkpoint, state)
+        print('Shard {0} of {1} done'.format(number + 1, shards))
+
+    # assemble final table from the shard files
+    headers = ['Metric', 'Filters'] +\
+              [comparison.name for comparison in comp.comparisons]
+    rows = _shard_rows(checkpoint, shards)
+    if sort:
+        rows = _external_sort(rows)
+    with open(output, 'w', newline='') as f:
+        _write_rows(f, headers, rows, fmt=fmt)
+
+    return _totals(state)
+
+
+##########
+#  Main  #
+##########
+
+def main(argv: list=None):
+    parser = argparse.ArgumentParser(
+        prog='mgproc',
+        description='Run mgproc comparisons without interaction.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run = commands.add_parser(
+        'run', help='compare all ranked metrics, with checkpoints')
+    run.add_argument('--compare', required=True,
+                     help='path to *.compare file')
+    run.add_argument('--metrics', required=True,
+                     help='path to *.metrics file')
+    run.add_argument('--ranks', type=int, default=1,
+                     help='number of base metrics per ranked metric')
+    run.add_argument('--directory',
+                     help='directory of the trees in the *.compare file')
+    run.add_argument('--output', help='file for the final table')
+    run.add_argument('--checkpoint',
+                     help='checkpoint directory (default: OUTPUT.checkpoint)')
+    run.add_argument('--shard-size', type=int, default=10000,
+                     help='number of ranked metrics per checkpoint')
+    run.add_argument('--budget', type=float,
+                     help='memory budget per shard in MB; '
+                          'overrides --shard-size')
+    run.add_argument('--format', dest='fmt', choices=['orgtbl', 'csv'],
+                     help='format of the final table')
+    run.add_argument('--sort', action='store_true',
+                     help='sort the rows of the final table')
+
+    batch = commands.add_parser('batch', help='run all jobs in a *.jobs file')
+    batch.add_argument('manifest', help='path to *.jobs file')
+    batch.add_argument('--workers', type=int,
+                       help='number of workers (default: one per CPU)')
+    batch.add_argument('--executor', choices=['process', 'thread'],
+                       default='process')
+    batch.add_argument('--output-dir', help='directory for result files')
+
+    export = commands.add_parser(
+        'export', help='write forest code for all trees in a folder')
+    export.add_argument('folder', help='folder with *.tree.forest files')
+    export.add_argument('--output-dir',
+                        help='directory for forest files (default: FOLDER)')
+    export.add_argument('--workers', type=int,
+                        help='number of workers (default: one per CPU)')
+    export.add_argument('--no-io', dest='io', action='store_false',
+                        help='omit index/outdex annotation')
+    export.add_argument('--arcs', choices=['tree', 'file'], default='tree',
+                        help='build move arcs from the trees or copy them '
+                             'from the *.move.forest files')
+    export.add_argument('--force', action='store_true',
+                        help='also export trees whose files are up to date')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        summary = run_sweep(args.compare, args.metrics, ranks=args.ranks,
+                            directory=args.directory, output=args.output,
+                            checkpoint=args.checkpoint,
+                            shard_size=args.shard_size,
+                            fmt=args.fmt, sort=args.sort,
+                            budget=int(args.budget * 2**20)
+                            if args.budget else None)
+        print('{success} successes, {tie} ties, {failure} failures'.format(
+            **summary))
+    elif args.command == 'batch':
+        for summary in run_jobs(args.manifest, workers=args.workers,
+                                executor=args.executor,
+                                output_dir=args.output_dir):
+            print('{output}: {success} successes, {tie} ties, '
+                  '{failure} failures'.format(**summary))
+    elif args.command == 'export':
+        written = export_folder(args.folder, output_dir=args.output_dir,
+                                io=args.io, arcs=args.arcs,
+                                workers=args.workers,
+                                force=args.force)
+        print('{0} files written'.format(len(written)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,14 +16,23 @@
 #   - .compare for running every comparison in the set
 #   - .show for printing the winners, ties, and losers among the metrics
 #
+# - ComparisonStatistics for aggregate counts over streams of metrics
+#
 # - Functions for definining Comparion(Set)s with text files
 
+import collections
+import csv
+import heapq
+import itertools
 import os
 import pprint
 import re
-import tabulate
+import sys
+import tempfile
 
-from mgproc import tree_from_file
+from metrics import _construct_ranked_metric, equivalence_classes,\
+    RankedMetric, ranked_metrics, FAILURE, TIE, SUCCESS
+from tree_files import tree_from_file
 
 class Comparison:
     """
@@ -63,14 +72,15 @@ class Comparison:
     def __init__(self, name: str='',
                  winner: 'IOTree'=None, loser: 'IOTree'=None,
                  metrics: set=set(), latex: str='',
-                 success: set=set(), tie: set=set(), failure: set=set()):
+                 success: set=None, tie: set=None, failure: set=None):
         self.name = name
         self.winner = winner
         self.loser = loser
         self.metrics = metrics
-        self.success = success
-        self.tie = tie
-        self.failure = failure
+        # fresh sets for every Comparison, lest they share their results
+        self.success = success if success is not None else set()
+        self.tie = tie if tie is not None else set()
+        self.failure = failure if failure is not None else set()
 
     def compare(self, metrics: set=set()):
         if not metrics:
@@ -128,25 +138,45 @@ class ComparisonSet:
     .comparisons: list
         stores all Comparisons belonging to this ComparisonSet
     .add: Comparison -> updated ComparisonSet
-        add a Comparison to .comparison
+        add a Comparison to .comparison; with compare=True, it is
+        evaluated right away
+    .add_metrics: list -> updated ComparisonSet
+        add metrics and only evaluate those
+    .add_base_metrics: list -> updated ComparisonSet
+        add the RankedMetrics that involve new BaseMetrics
     .compare:
-        call .compare for every member of the ComparisonSet
+        call .compare for every member of the ComparisonSet;
+        with early_exit=True, metrics are dropped at their first failure
+    .skipped: int
+        number of evaluations skipped by the last early-exit .compare
+    .compare_classes:
+        compare RankedMetrics built from equivalence classes of BaseMetrics
+    .expand:
+        generate RankedMetrics for all members of the equivalence classes
     .merge:
-        merge another ComparisonSet into this one; to be implemented
+        merge the results of another ComparisonSet into this one
+    .aggregate:
+        stream metrics through all comparisons, only keeping statistics
+    .top_margins:
+        find the metrics with the largest margin between winners and losers
     .show():
         print the overview of successful, tie-ing, and failing metrics
     .table():
         print tabular overview of comparison results per metric
+    .export():
+        write comparison results per metric to a csv or npz file
     .trees():
         print list of trees used in comparison
     """
     def __init__(self, args: list, name: str='', metrics: set=set(),
-                 success: set=set(), tie: set=set(), failure: set=set()):
+                 success: set=None, tie: set=None, failure: set=None):
         self.name = name
         self.metrics = metrics
-        self.success = success
-        self.tie = tie
-        self.failure = failure
+        self.success = success if success is not None else set()
+        self.tie = tie if tie is not None else set()
+        self.failure = failure if failure is not None else set()
+        self.skipped = 0
+        self.classes = {}
         self.comparisons = []
         self._winners = []
         self._losers = []
@@ -174,31 +204,333 @@ class ComparisonSet:
             self._trees = self._winners + self._losers
         return self._trees
 
-    def add(self, comparison):
+    def add(self, comparison, compare: bool=False):
+        """
+        Add Comparison to the collection.
+
+        With compare=True, the metrics of the ComparisonSet are run through
+        the new Comparison right away. Only the new Comparison is evaluated,
+        the results of all other Comparisons are kept.
+        """
         self.comparisons.append(comparison)
+        # trees have to be collected anew
+        self._winners = []
+        self._losers = []
+        self._trees = []
+        if compare and self.metrics:
+            comparison.compare(self.metrics)
+            self._tally()
+
+    def add_metrics(self, metrics: list):
+        """
+        Add metrics and run them through every Comparison.
+
+        Only the new metrics are evaluated, the results of the metrics that
+        are already in the ComparisonSet are kept.
+
+        Parameters
+        ----------
+        metrics: list
+            RankedMetrics to be added
+
+        Examples
+        --------
+        >>> comp.add_metrics(metrics_from_file('./metrics/new', ranks=1))
+        """
+        present = set(self.metrics)
+        metrics = [metric for metric in metrics if metric not in present]
+        if not metrics:
+            return
+        for comparison in self.comparisons:
+            comparison.compare(metrics)
+        self.metrics = list(self.metrics) + metrics
+        self._tally()
+
+    def add_base_metrics(self, base_metrics: list, ranks: int=None):
+        """
+        Extend the RankedMetrics of the ComparisonSet by new BaseMetrics.
+
+        The ComparisonSet's RankedMetrics are assumed to be all RankedMetrics
+        of rank ranks over some set B of BaseMetrics. This adds the
+        RankedMetrics of the same rank over B plus base_metrics, which
+        contain at least one of the new BaseMetrics, and only evaluates those.
+
+        Parameters
+        ----------
+        base_metrics: list
+            new BaseMetrics (e.g. from a new line in a *.metrics file)
+        ranks: int
+            rank of RankedMetrics; defaults to the rank of the present ones
+
+        Examples
+        --------
+        >>> comp = comparisons_from_file('./comparisons/rc_wh/SRC-ORC',
+        >>>                              metrics=metrics_from_file(
+        >>>                                  './metrics/filtered', ranks=2))
+        >>> comp.add_base_metrics(base_metrics_from_file('./metrics/new'))
+        """
+        old = []
+        for metric in self.metrics:
+            for base_metric in metric.metrics:
+                if base_metric not in old:
+                    old.append(base_metric)
+        if ranks is None:
+            ranks = max([len(metric.metrics) for metric in self.metrics],
+                        default=1)
+        new = [metric for metric in base_metrics if metric not in old]
+        if not new:
+            return
+
+        # new compact metrics share the contrasts of the present ones
+        compact = any(metric.compact for metric in self.metrics)
+        contrasts = {}
+        for metric in self.metrics:
+            if metric.compact:
+                contrasts = metric._contrasts
+                break
 
-    def compare(self, comparisons: set=None):
+        new_set = set(new)
+        self.add_metrics([RankedMetric(metric_tuple, compact=compact,
+                                       contrasts=contrasts
+                                       if compact else None)
+                          for metric_tuple in
+                          itertools.product(old + new, repeat=ranks)
+                          if new_set.intersection(metric_tuple)])
+
+    def compare(self, comparisons: set=None, early_exit: bool=False):
+        """
+        Run comparisons for all metrics.
+
+        With early_exit=True, comparisons are ordered by how many base metrics
+        fail them, and a metric is no longer tested once it fails a single
+        comparison. This does not affect .success, but the profiles of failed
+        metrics are incomplete. The number of skipped (metric, comparison)
+        evaluations is stored in .skipped.
+
+        Parameters
+        ----------
+        comparisons: set
+            Comparisons to be run; by default, all of them
+        early_exit: bool
+            stop testing metrics after their first failure
+        """
         # by default no Comparisons are passed;
         # in that case, use the full collection
         if not comparisons:
             comparisons = self.comparisons
 
-        for comparison in comparisons:
-            comparison.compare(self.metrics)
+        if early_exit:
+            self._compare_early_exit(comparisons)
+        else:
+            for comparison in comparisons:
+                comparison.compare(self.metrics)
 
         # update our record of how the metrics did
-        self.success = set.intersection(*[comparison.success
-                                          for comparison in comparisons])
-        self.failure = set.union(*[comparison.failure
-                                   for comparison in comparisons])
-        self.tie = set(self.metrics).difference(
-                   self.success.union(self.failure))
-        # self.tie = set.intersection(*[comparison.tie
-                                      # for comparison in comparisons])
-
-    def merge(self, compset: 'ComparisonSet') -> 'ComparisonSet':
-        # fixme: to be implemented
-        pass
+        self._tally()
+
+    def _compare_early_exit(self, comparisons: list):
+        """Run comparisons in order of discriminative power, dropping failures"""
+        ordered = sorted(comparisons, key=self._discrimination, reverse=True)
+        remaining = len(ordered)
+        alive = list(self.metrics)
+        self.skipped = 0
+
+        for comparison in ordered:
+            # Comparison.compare falls back to its own metrics if it is
+            # given none, so stop as soon as every metric has failed
+            if not alive:
+                break
+            comparison.compare(alive)
+            remaining -= 1
+            survivors = [metric for metric in alive
+                         if metric.viable != (False, False)]
+            self.skipped += (len(alive) - len(survivors)) * remaining
+            alive = survivors
+
+    def _discrimination(self, comparison: 'Comparison') -> int:
+        """Count base metrics that fail comparison"""
+        base_metrics = {base_metric
+                        for metric in self.metrics
+                        for base_metric in metric.metrics}
+        failures = 0
+        for base_metric in base_metrics:
+            if _base_value(comparison.winner, base_metric) >\
+               _base_value(comparison.loser, base_metric):
+                failures += 1
+        return failures
+
+    def compare_classes(self, base_metrics: list, ranks: int=1,
+                        compact: bool=False, early_exit: bool=False):
+        """
+        Run comparisons for RankedMetrics over equivalence classes.
+
+        The BaseMetrics are grouped into classes of metrics that assign the
+        same values to every tree in the ComparisonSet (see
+        equivalence_classes), and RankedMetrics are only built from one
+        representative per class. This shrinks the number of RankedMetrics
+        from len(base_metrics)**ranks to len(classes)**ranks. Use .expand to
+        recover the results for all members of the classes.
+
+        Parameters
+        ----------
+        base_metrics: list
+            list of BaseMetrics
+        ranks: int
+            number of BaseMetrics per RankedMetric
+        compact: bool
+            build compact RankedMetrics
+        early_exit: bool
+            see .compare
+
+        Examples
+        --------
+        >>> base_metrics = base_metrics_from_file('./metrics/filtered')
+        >>> comp.compare_classes(base_metrics, ranks=3)
+        >>> successful = list(comp.expand('success'))
+        """
+        self.classes = equivalence_classes(base_metrics, self.trees())
+        self.metrics = _construct_ranked_metric(metric_set=list(self.classes),
+                                                ranks=ranks, compact=compact)
+        self.compare(early_exit=early_exit)
+
+    def expand(self, subtype: str=None) -> 'iterable':
+        """
+        Generate RankedMetrics for all members of the equivalence classes.
+
+        After .compare_classes, every RankedMetric stands in for all
+        RankedMetrics built from equivalent BaseMetrics. These are generated
+        one by one and share the results of their representative.
+
+        Parameters
+        ----------
+        subtype: str
+            success, tie, or failure; by default, all metrics are expanded
+        """
+        metrics = self.metrics
+        if subtype:
+            selected = getattr(self, subtype)
+            metrics = [metric for metric in metrics if metric in selected]
+
+        for metric in metrics:
+            if not self.classes:
+                yield metric
+                continue
+            # metrics added after .compare_classes have no classes
+            for members in itertools.product(*[self.classes.get(base_metric,
+                                                                 [base_metric])
+                                               for base_metric
+                                               in metric.metrics]):
+                yield metric.variant(members)
+
+    def _tally(self):
+        """
+        Sort metrics into success, tie, and failure by their results.
+
+        Only the results for the Comparisons of this ComparisonSet count,
+        not the overall viability of the metrics, which also reflects any
+        other Comparisons the same metric objects have been run through.
+        """
+        names = [comparison.name for comparison in self.comparisons]
+        self.success = set()
+        self.tie = set()
+        self.failure = set()
+        groups = {SUCCESS: self.success, TIE: self.tie, FAILURE: self.failure}
+        for metric in self.metrics:
+            # viability is the worst result over all Comparisons,
+            # so a metric that is viable overall is viable here
+            if metric.viable == (True, True):
+                self.success.add(metric)
+                continue
+            profile = metric.profile
+            groups[min([metric.outcome(name)
+                        for name in names if name in profile],
+                       default=SUCCESS)].add(metric)
+
+    def merge(self, compset: 'ComparisonSet',
+              fill: bool=False) -> 'ComparisonSet':
+        """
+        Merge the results of another ComparisonSet into this one.
+
+        Metrics are identified by name and filters, Comparisons by name.
+        Metrics of compset that self does not have are added, and so are
+        Comparisons. For metrics that are in both, the results of compset
+        are copied for every Comparison that self has not tested them on
+        (see RankedMetric.merge). Nothing is recomputed, so a metric that
+        only occurs in one of the two sets has no results for the
+        Comparisons that only occur in the other; these are shown as Skip
+        in tables unless fill=True.
+
+        Parameters
+        ----------
+        compset: ComparisonSet
+            ComparisonSet whose results are to be added
+        fill: bool
+            evaluate metrics on the Comparisons they have not been tested on
+
+        Examples
+        --------
+        Each ComparisonSet needs its own metric objects, since the results
+        are stored in the metrics themselves:
+
+        >>> first = comparisons_from_file('./comparisons/rc_wh/SRC-ORC',
+        >>>                               metrics=metrics_from_file(
+        >>>                                   './metrics/base', ranks=2))
+        >>> second = comparisons_from_file('./comparisons/rc_wh/Stacked-RCs',
+        >>>                                metrics=metrics_from_file(
+        >>>                                    './metrics/base', ranks=2))
+        >>> first.merge(second).table()
+        """
+        own = {self._metric_id(metric): metric for metric in self.metrics}
+        mapping = {}
+        added = []
+        for metric in compset.metrics:
+            key = self._metric_id(metric)
+            if key in own:
+                own[key].merge(metric)
+                mapping[metric] = own[key]
+            else:
+                own[key] = metric
+                mapping[metric] = metric
+                added.append(metric)
+        self.metrics = list(self.metrics) + added
+
+        comparisons = {comparison.name: comparison
+                       for comparison in self.comparisons}
+        for comparison in compset.comparisons:
+            results = {subtype: {mapping[metric]
+                                 for metric in getattr(comparison, subtype)
+                                 if metric in mapping}
+                       for subtype in ['success', 'tie', 'failure']}
+            if comparison.name in comparisons:
+                # reclassify metrics by their merged results for the
+                # Comparison, lest they end up in more than one group
+                own_comparison = comparisons[comparison.name]
+                groups = {SUCCESS: own_comparison.success,
+                          TIE: own_comparison.tie,
+                          FAILURE: own_comparison.failure}
+                for metrics in results.values():
+                    for metric in metrics:
+                        for group in groups.values():
+                            group.discard(metric)
+                        groups[metric.outcome(comparison.name)].add(metric)
+            else:
+                self.add(Comparison(name=comparison.name,
+                                    winner=comparison.winner,
+                                    loser=comparison.loser,
+                                    metrics=comparison.metrics,
+                                    **results))
+
+        for key, members in compset.classes.items():
+            self.classes.setdefault(key, members)
+
+        if fill:
+            for comparison in self.comparisons:
+                missing = [metric for metric in self.metrics
+                           if comparison.name not in metric.profile]
+                if missing:
+                    comparison.compare(missing)
+        self._tally()
+        return self
 
     def _metric_id(self, metric: 'RankedMetric'):
         return '{0}_{1}'.format(metric._name(), metric._filters())
@@ -222,13 +554,108 @@ class ComparisonSet:
         else:
             pprint.pprint(self._metric_dict(function=self._metric_id))
 
-    def _matrix(self, numerical: bool=False):
-        metrics = self.metrics
-        rows = []
+    def _evaluate(self, metric: 'RankedMetric'):
+        """Run a single metric through every comparison without storing it"""
+        for comparison in self.comparisons:
+            metric.compare(comparison.name,
+                           comparison.winner, comparison.loser,
+                           cache=False)
+
+    def aggregate(self, metrics: 'iterable',
+                  top: int=10) -> 'ComparisonStatistics':
+        """
+        Stream metrics through all comparisons and only keep statistics.
+
+        Unlike .compare, this neither stores the metrics nor their results,
+        so metrics can be a generator over a space of RankedMetrics that is
+        too large to be held in memory.
+
+        Parameters
+        ----------
+        metrics: iterable
+            RankedMetrics to be evaluated, preferably compact ones
+        top: int
+            number of best metrics to keep track of
+
+        Examples
+        --------
+        >>> base_metrics = base_metrics_from_file('./metrics/filtered')
+        >>> stats = comp.aggregate(ranked_metrics(base_metrics, ranks=4,
+        >>>                                       compact=True))
+        >>> stats.show()
+        """
+        stats = ComparisonStatistics([comparison.name
+                                      for comparison in self.comparisons],
+                                     top=top)
         for metric in metrics:
+            self._evaluate(metric)
+            stats.add(metric)
+        return stats
+
+    def top_margins(self, k: int=10, base_metrics: list=None,
+                    ranks: int=1, chunk_size: int=100000) -> list:
+        """
+        Find the metrics that separate winners from losers most clearly.
+
+        For each metric and Comparison, the margin is the difference between
+        the loser's and the winner's value for the first BaseMetric that
+        distinguishes them; margins are summed over all Comparisons. This is
+        computed in chunks with NumPy (see engine.top_margins), keeping only
+        the k best metrics.
+
+        Parameters
+        ----------
+        k: int
+            number of metrics to be returned
+        base_metrics: list
+            if specified, all RankedMetrics of rank ranks over base_metrics
+            are ranked instead of the metrics of the ComparisonSet
+        ranks: int
+            rank of RankedMetrics built from base_metrics
+        chunk_size: int
+            number of metrics evaluated at once
+
+        Returns
+        -------
+        list
+            (metric, total margin) pairs, best first
+
+        Examples
+        --------
+        >>> for metric, margin in comp.top_margins(k=5):
+        >>>     print(metric.name, metric.filters, margin)
+        """
+        import engine
+
+        if base_metrics is None:
+            # metrics may be a set, so fix one order for ranking and lookup
+            metrics = list(self.metrics)
+            return [(metrics[number], margin)
+                    for margin, number in engine.top_margins_of(
+                        self, metrics, k=k, chunk_size=chunk_size)]
+
+        return [(next(ranked_metrics(base_metrics, ranks=ranks,
+                                     start=number, stop=number + 1,
+                                     compact=True)), margin)
+                for margin, number in engine.top_margins(
+                    self, base_metrics, ranks=ranks, k=k,
+                    chunk_size=chunk_size)]
+
+    def _rows(self, numerical: bool=False, metrics: list=None,
+              evaluate: bool=False):
+        """Generate table rows one metric at a time"""
+        if metrics is None:
+            metrics = self.metrics
+
+        for metric in metrics:
+            if evaluate:
+                self._evaluate(metric)
             row = [metric.name, metric.filters]
             for comparison in self.comparisons:
-                if numerical:
+                if comparison.name not in metric.profile:
+                    # skipped by early exit
+                    row.append('Skip')
+                elif numerical:
                     winner = str(
                         metric.profile[comparison.name]['desired winner'][2])
                     loser = str(
@@ -236,15 +663,82 @@ class ComparisonSet:
                     result = '{0}/{1}'.format(winner, loser)
                     row.append(result)
                 else:
-                    result = metric.profile[comparison.name]['captured']
+                    result = metric.captured(comparison.name)
                     row.append(_rewrite_tuple(result))
-            rows.append(row)
-        return rows
+            yield row
+
+    def _matrix(self, numerical: bool=False):
+        return list(self._rows(numerical=numerical))
+
+    def table(self, numerical: bool=False, filename: str=None,
+              stream: bool=False, metrics: 'iterable'=None,
+              fmt: str='orgtbl', sort: bool=True, chunk_size: int=100000,
+              expand: bool=False):
+        """
+        Print or save tabular overview of comparison results per metric.
+
+        By default, the full table is built in memory and typeset with
+        tabulate. In streaming mode, each row is written to filename as soon
+        as it has been computed, so memory usage does not depend on the number
+        of metrics. Rows can still be sorted, in which case they are sorted in
+        chunks of chunk_size rows that are buffered in temporary files and
+        merged at the end.
 
-    def table(self, numerical: bool=False, filename: str=None):
+        Parameters
+        ----------
+        numerical: bool
+            show winner/loser values instead of Yes/Tie/No
+        filename: str
+            file to write the table to; if not specified, print it
+        stream: bool
+            write the table row by row instead of building it in memory
+        metrics: iterable
+            streaming only; metrics that have not been compared yet, each of
+            which is run through all comparisons right before its row is
+            written (e.g. a generator of RankedMetrics); these metrics are
+            not added to .success, .tie, or .failure
+        fmt: str
+            streaming only; orgtbl or csv
+        sort: bool
+            streaming only; sort rows by metric name and filters
+        chunk_size: int
+            streaming only; number of rows that are sorted in memory at once
+        expand: bool
+            list all members of the equivalence classes (see .expand)
+
+        Examples
+        --------
+        >>> comp.table(filename='rc_prom.org', stream=True)
+        >>> comp.table(filename='rc_prom.csv', stream=True, fmt='csv',
+        >>>            metrics=(RankedMetric(pair) for pair in pairs))
+        """
         headers = ['Metric', 'Filters'] +\
                   [comp.name for comp in self.comparisons]
-        table = tabulate.tabulate(sorted(self._matrix(numerical=numerical)),
+
+        if expand and metrics is None:
+            metrics = self.expand()
+            evaluate = False
+        else:
+            evaluate = metrics is not None
+
+        if stream:
+            rows = self._rows(numerical=numerical,
+                              metrics=metrics,
+                              evaluate=evaluate)
+            if sort:
+                rows = _external_sort(rows, chunk_size=chunk_size)
+            if filename:
+                with open(filename, 'w', newline='') as f:
+                    _write_rows(f, headers, rows, fmt=fmt)
+            else:
+                _write_rows(sys.stdout, headers, rows, fmt=fmt)
+            return
+
+        matrix = list(self._rows(numerical=numerical, metrics=metrics,
+                                 evaluate=evaluate))
+        # tabulate is only needed here, so do not import it up front
+        import tabulate
+        table = tabulate.tabulate(sorted(matrix),
                                   tablefmt='orgtbl', headers=headers)
         if filename:
             f = open(filename, 'w')
@@ -253,6 +747,261 @@ class ComparisonSet:
         else:
             print(table)
 
+    def export(self, filename: str, fmt: str=None, expand: bool=False):
+        """
+        Write comparison results to a columnar file.
+
+        Unlike .table, this never builds the full table in memory. With the
+        csv format, every metric is written as soon as its row has been
+        computed. The row has one column for the overall result and, for every
+        comparison, one column each for the outcome, the winner's value, and
+        the loser's value.
+
+        The npz format stores NumPy arrays instead:
+
+        'metric', 'filters': names and filters of the metrics
+        'comparison': names of the comparisons
+        'outcome': outcome code per metric and comparison
+                   (2 = success, 1 = tie, 0 = failure, -1 = skipped)
+        'winner', 'loser': value per metric, comparison, and rank;
+                           list-valued components (e.g. MaxTR) are NaN
+
+        Parameters
+        ----------
+        filename: str
+            path to output file
+        fmt: str
+            csv or npz; if not specified, it is inferred from filename
+        expand: bool
+            list all members of the equivalence classes (see .expand)
+
+        Examples
+        --------
+        >>> comp.export('./results/rc_prom.csv')
+        >>> comp.export('./results/rc_prom.npz')
+        """
+        if not fmt:
+            fmt = 'npz' if filename.endswith('.npz') else 'csv'
+
+        if fmt == 'csv':
+            self._export_csv(filename,
+                             self.expand() if expand else self.metrics)
+        elif fmt == 'npz':
+            self._export_npz(filename,
+                             list(self.expand()) if expand else self.metrics)
+        else:
+            raise Exception('Unknown export format {0}'.format(fmt))
+
+    def _export_csv(self, filename: str, metrics: 'iterable'):
+        headers = ['metric', 'filters', 'overall']
+        for comp in self.comparisons:
+            headers += [comp.name,
+                        comp.name + ':winner',
+                        comp.name + ':loser']
+
+        with open(filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(headers)
+            for metric in metrics:
+                row = [metric.name, metric.filters,
+                       _rewrite_tuple(metric.viable)]
+                for comp in self.comparisons:
+                    if comp.name not in metric.profile:
+                        row += ['Skip', '', '']
+                        continue
+                    contrast = metric.profile[comp.name]
+                    row += [_rewrite_tuple(contrast['captured']),
+                            contrast['desired winner'][2],
+                            contrast['desired loser'][2]]
+                writer.writerow(row)
+
+    def _export_npz(self, filename: str, metrics: list):
+        import numpy
+
+        ranks = max([len(metric.metrics) for metric in metrics], default=0)
+        shape = (len(metrics), len(self.comparisons))
+
+        outcome = numpy.zeros(shape, dtype=numpy.int8)
+        winner = numpy.full(shape + (ranks,), numpy.nan)
+        loser = numpy.full(shape + (ranks,), numpy.nan)
+
+        for row, metric in enumerate(metrics):
+            for col, comp in enumerate(self.comparisons):
+                if comp.name not in metric.profile:
+                    outcome[row, col] = -1
+                    continue
+                contrast = metric.profile[comp.name]
+                outcome[row, col] = metric.outcome(comp.name)
+                for rank, value in enumerate(contrast['desired winner'][2]):
+                    if not isinstance(value, list):
+                        winner[row, col, rank] = value
+                for rank, value in enumerate(contrast['desired loser'][2]):
+                    if not isinstance(value, list):
+                        loser[row, col, rank] = value
+
+        numpy.savez_compressed(
+            filename,
+            metric=numpy.array([metric.name for metric in metrics], dtype=str),
+            filters=numpy.array([metric.filters for metric in metrics],
+                                dtype=str),
+            comparison=numpy.array([comp.name for comp in self.comparisons],
+                                   dtype=str),
+            outcome=outcome, winner=winner, loser=loser)
+
+
+class ComparisonStatistics:
+    """
+    Aggregate statistics over a stream of metrics.
+
+    Only counters and a bounded list of the best metrics are stored, so
+    memory usage does not grow with the number of metrics.
+
+    Public Methods
+    --------------
+    .total: int
+        number of metrics seen so far
+    .overall: dict
+        number of successful, tie-ing, and failing metrics
+    .contrasts: dict
+        maps each comparison name to its number of successful, tie-ing,
+        and failing metrics
+    .base_metrics: Counter
+        how many successful metrics each BaseMetric, identified by
+        (name, filters), is part of
+    .add: RankedMetric -> updated statistics
+        count the results of a metric that has been run through all
+        comparisons
+    .merge: ComparisonStatistics -> updated statistics
+        add the counts of statistics over a different stream of metrics
+    .best: list
+        (name, filters, successes, ties) of the metrics that capture the most
+        comparisons, with ties as tie-breaker, best first
+    .show:
+        print overview of the statistics
+    """
+    _subtypes = {SUCCESS: 'success', TIE: 'tie', FAILURE: 'failure'}
+
+    def __init__(self, comparisons: list, top: int=10):
+        self.comparisons = comparisons
+        self.top = top
+        self.total = 0
+        self.overall = {'success': 0, 'tie': 0, 'failure': 0}
+        self.contrasts = {name: {'success': 0, 'tie': 0, 'failure': 0}
+                          for name in comparisons}
+        self.base_metrics = collections.Counter()
+        # min-heap of ((successes, ties), -position, name, filters),
+        # so the worst of the best metrics is always on top
+        self._heap = []
+
+    def add(self, metric: 'RankedMetric'):
+        """Count results of metric"""
+        self.total += 1
+        counts = {SUCCESS: 0, TIE: 0, FAILURE: 0}
+        for name in self.comparisons:
+            code = metric.outcome(name)
+            counts[code] += 1
+            self.contrasts[name][self._subtypes[code]] += 1
+
+        overall = min([code for code in counts if counts[code]],
+                      default=SUCCESS)
+        self.overall[self._subtypes[overall]] += 1
+        if overall == SUCCESS:
+            for base_metric in set(metric.metrics):
+                self.base_metrics[(base_metric.name,
+                                   ''.join(sorted(base_metric.filters)))] += 1
+
+        self._push(((counts[SUCCESS], counts[TIE]), -self.total,
+                    metric.name, metric.filters))
+
+    def _push(self, item: tuple):
+        if len(self._heap) < self.top:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def merge(self, stats: 'ComparisonStatistics') -> 'ComparisonStatistics':
+        """Add counts of stats, which must be over the same comparisons"""
+        self.total += stats.total
+        for subtype, count in stats.overall.items():
+            self.overall[subtype] += count
+        for name, counts in stats.contrasts.items():
+            for subtype, count in counts.items():
+                self.contrasts[name][subtype] += count
+        self.base_metrics.update(stats.base_metrics)
+        for item in stats._heap:
+            self._push(item)
+        return self
+
+    def best(self) -> list:
+        """Return the best metrics, best first"""
+        return [(name, filters, successes, ties)
+                for (successes, ties), _, name, filters
+                in sorted(self._heap, reverse=True)]
+
+    def show(self):
+        pprint.pprint({'total': self.total,
+                       'overall': self.overall,
+                       'contrasts': self.contrasts,
+                       'base metrics': self.base_metrics.most_common(self.top),
+                       'best': self.best()})
+
+
+def _base_value(tree: 'IOTree', metric: 'BaseMetric'):
+    """Value of tree under BaseMetric, using value table if available"""
+    try:
+        return tree.base_value(metric)
+    except AttributeError:
+        return metric.eval(tree)
+
+
+def _write_rows(handle, headers: list, rows: 'iterable', fmt: str='orgtbl'):
+    """Write header and rows to file handle as org table or csv"""
+    if fmt == 'csv':
+        writer = csv.writer(handle)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    elif fmt == 'orgtbl':
+        # column widths cannot be known in advance,
+        # so we pad to the width of the header only
+        widths = [len(header) for header in headers]
+        handle.write(_org_row(headers, widths) + '\n')
+        handle.write('|' + '+'.join(['-' * (width + 2) for width in widths]) +
+                     '|\n')
+        for row in rows:
+            handle.write(_org_row(row, widths) + '\n')
+    else:
+        raise Exception('Unknown table format {0}'.format(fmt))
+
+
+def _org_row(row: list, widths: list) -> str:
+    """Typeset list of strings as row of org table"""
+    return '| ' + ' | '.join([str(cell).ljust(width)
+                              for cell, width in zip(row, widths)]) + ' |'
+
+
+def _external_sort(rows: 'iterable', chunk_size: int=100000) -> 'iterable':
+    """
+    Sort rows with bounded memory.
+
+    Rows are sorted in chunks of chunk_size, each sorted chunk is buffered in
+    a temporary csv file, and the chunks are lazily merged with heapq.merge.
+    """
+    runs = []
+    while True:
+        chunk = sorted(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        run = tempfile.TemporaryFile(mode='w+', newline='')
+        csv.writer(run).writerows(chunk)
+        run.seek(0)
+        runs.append(run)
+
+    try:
+        yield from heapq.merge(*[csv.reader(run) for run in runs])
+    finally:
+        for run in runs:
+            run.close()
+
 
 def _rewrite_tuple(tuplepair: (bool, bool)) -> str:
     """Rewrite (bool, bool) pair as human-friendly string"""
@@ -267,8 +1016,20 @@ def _rewrite_tuple(tuplepair: (bool, bool)) -> str:
 #########################################
 
 
+def _shared_tree(path: str, trees: dict=None) -> 'MetricTree':
+    """Build tree from file, reusing trees already stored in trees"""
+    if trees is None:
+        return tree_from_file(path)
+
+    key = os.path.abspath(path)
+    if key not in trees:
+        trees[key] = tree_from_file(path)
+    return trees[key]
+
+
 def _comparison_from_line(comparison_line: str, metrics: set=set(),
-                          inputfile: str='', directory: str=None) -> dict:
+                          inputfile: str='', directory: str=None,
+                          trees: dict=None) -> dict:
     """
     Construct Comparison from line in *.compare file.
 
@@ -290,6 +1051,8 @@ def _comparison_from_line(comparison_line: str, metrics: set=set(),
         path to *.compare file
     directory: str
         if specified, this will be prepended to the paths for winner and loser
+    trees: dict
+        cache of trees by absolute path, shared between comparisons
     """
     # split line at every ; and keep first four values
     parameters = [field.strip() for field in comparison_line.split(';')]
@@ -304,8 +1067,8 @@ not enough parameters specified'
     if directory:
         winner_path = os.path.join(directory, winner_path)
         loser_path = os.path.join(directory, loser_path)
-    winner = tree_from_file(winner_path)
-    loser = tree_from_file(loser_path)
+    winner = _shared_tree(winner_path, trees)
+    loser = _shared_tree(loser_path, trees)
 
     # return dictionary from which the Comparison will be built
     return {'name': name, 'latex': latex, 'metrics': metrics,
@@ -315,7 +1078,11 @@ not enough parameters specified'
 def comparisons_from_file(inputfile: str=None,
                           directory: str=None,
                           extension: str='.compare',
-                          metrics: set=set()) -> 'ComparisonSet':
+                          metrics: set=set(),
+                          base_metrics: list=None,
+                          ranks: int=1,
+                          compact: bool=False,
+                          trees: dict=None) -> 'ComparisonSet':
     """
     Build collection of Comparisons from *.compare file.
 
@@ -337,6 +1104,18 @@ def comparisons_from_file(inputfile: str=None,
     extension: str
         overwrite default file extension for *.compare files
     metrics: set
+        set of metrics to be used in comparison
+    base_metrics: list
+        if specified, metrics is ignored and RankedMetrics of rank ranks are
+        built only over equivalence classes of these BaseMetrics
+        (see ComparisonSet.compare_classes)
+    ranks: int
+        rank of RankedMetrics built from base_metrics
+    compact: bool
+        build compact RankedMetrics from base_metrics
+    trees: dict
+        cache of trees by absolute path; trees found here are not
+        rebuilt, and newly built trees are added to it
     """
     # ask for input file if necessary
     if not inputfile:
@@ -354,7 +1133,8 @@ def comparisons_from_file(inputfile: str=None,
     with open(inputfile + extension, 'r') as compfile:
 
         # create list of dictionary, each one of defines a Comparison
-        parameter_dicts = [_comparison_from_line(line, metrics, inputfile, directory)
+        parameter_dicts = [_comparison_from_line(line, metrics, inputfile,
+                                                 directory, trees)
                            for line in compfile.readlines()
                            if not (re.match(r'^\s*$', line) or
                                    re.match(r'\s*#.*', line))]
@@ -362,5 +1142,8 @@ def comparisons_from_file(inputfile: str=None,
 
     comp = ComparisonSet(parameter_dicts, name=basename,
                          metrics=metrics)
-    comp.compare()
+    if base_metrics:
+        comp.compare_classes(base_metrics, ranks=ranks, compact=compact)
+    else:
+        comp.compare()
     return comp
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This file is an alternative to ComparisonSet.compare in comparisons.py
+#
+# It defines a vectorized engine for evaluating all RankedMetrics of
+# metric_set^ranks over every Comparison of a ComparisonSet at once.
+#
+# A RankedMetric <m_1, ..., m_k> captures a contrast iff its list of values
+# for the winner is lexicographically smaller than the one for the loser
+# (see RankedMetric._captures). Hence its outcome is determined by the first
+# m_i that does not assign the same value to both trees. The engine
+#
+# 1. replaces the values of each BaseMetric by their dense ranks among all
+#    values the metric assigns to the trees of the ComparisonSet; this
+#    preserves the order of values, including list values (e.g. operator
+#    sorted), which are first padded to fixed-width integer arrays that are
+#    ordered the way Python orders (nested) lists (see encode_lists),
+# 2. computes for each BaseMetric and contrast the sign of the difference
+#    between the ranks of winner and loser,
+# 3. picks the first non-zero sign along each RankedMetric, for chunks of
+#    RankedMetrics at a time.
+#
+# The same first-difference logic yields the margin by which a RankedMetric
+# separates winner and loser (see top_margins).
+#
+# RankedMetrics are numbered as in metrics._construct_ranked_metric, i.e.
+# in the order of itertools.product, so that the n-th RankedMetric can be
+# rebuilt with metrics.ranked_metrics(metric_set, ranks, start=n, stop=n+1).
+#
+# This module requires numpy.
+
+import heapq
+
+import numpy
+
+from metrics import MetricTree, FAILURE, TIE, SUCCESS, _hashable
+
+
+####################
+#  Value Matrices  #
+####################
+
+def _shape(values: list):
+    """
+    Common shape of (nested) lists: None for numbers, or (width, shape of
+    members), where width is the length of the longest list
+    """
+    lists = [value for value in values if isinstance(value, (list, tuple))]
+    if not lists:
+        return None
+    if len(lists) < len(values):
+        raise ValueError('cannot encode a mixture of lists and numbers')
+    return (max(len(value) for value in lists),
+            _shape([member for value in lists for member in value]))
+
+
+def _size(shape) -> int:
+    """Number of columns taken up by a value of shape"""
+    if shape is None:
+        return 1
+    width, member_shape = shape
+    if member_shape is None:
+        return width
+    return width * (1 + _size(member_shape))
+
+
+def _leaves(value) -> list:
+    """Numbers in (nested) list value, in order"""
+    if not isinstance(value, (list, tuple)):
+        return [value]
+    return [number for member in value for number in _leaves(member)]
+
+
+def _encode(value: list, shape: tuple, padding, row: list):
+    """Append encoding of (nested) list value to row"""
+    width, member_shape = shape
+    if member_shape is None:
+        row.extend(value)
+        row.extend([padding] * (width - len(value)))
+        return
+    # every member is preceded by a marker, and missing members are all
+    # below it, so that a proper prefix is smaller even if the next member
+    # of the longer list is empty
+    for member in value:
+        row.append(padding)
+        _encode(member, member_shape, padding, row)
+    row.extend([padding - 1] *
+               ((width - len(value)) * (1 + _size(member_shape))))
+
+
+def encode_lists(values: list, width: int=None) -> 'numpy.ndarray':
+    """
+    Encode (nested) lists of numbers as rows of a fixed-width array.
+
+    Shorter lists are padded with a value below every number that occurs in
+    the lists. Comparing rows lexicographically thus gives the same result as
+    comparing the lists themselves in Python: at the first position where
+    one list has run out, its padding is smaller than the other list's
+    number, just like a proper prefix is smaller in Python.
+
+    Nested lists (e.g. values of metrics with operator sorted over
+    recursive load types) are flattened in order. Each member list is
+    padded to the same width and preceded by a marker, which missing
+    members undercut, so the order is preserved at every level.
+
+    Parameters
+    ----------
+    values: list
+        list of (nested) lists (or tuples) of numbers
+    width: int
+        number of top-level members; defaults to the length of the longest
+        list
+
+    Raises
+    ------
+    ValueError
+        if lists and numbers occur at the same level
+
+    Examples
+    --------
+    >>> encode_lists([[3, 2], [3], [], [3, 2, 2]])
+    array([[3, 2, 1],
+           [3, 1, 1],
+           [1, 1, 1],
+           [3, 2, 2]])
+    >>> encode_lists([[[2, 1]], [[2]], []])
+    array([[ 0,  2,  1],
+           [ 0,  2,  0],
+           [-1, -1, -1]])
+    """
+    shape = _shape(values)
+    if shape is None:
+        raise ValueError('cannot encode numbers as lists')
+    if width is not None:
+        shape = (max(width, shape[0]), shape[1])
+    # every row needs at least one column, lest empty lists vanish
+    shape = (max(shape[0], 1), shape[1])
+
+    flat = numpy.array([number for value in values
+                        for number in _leaves(value)])
+    padding = flat.min() - 1 if flat.size else 0
+
+    rows = []
+    for value in values:
+        row = []
+        _encode(value, shape, padding, row)
+        rows.append(row)
+    return numpy.array(rows, dtype=flat.dtype if flat.size else numpy.int64)
+
+
+def _dense_ranks(values: list) -> 'numpy.ndarray':
+    """Replace values by their ranks among the distinct values"""
+    if values and isinstance(values[0], (list, tuple)):
+        try:
+            # unique sorts rows lexicographically
+            _, ranks = numpy.unique(encode_lists(values), axis=0,
+                                    return_inverse=True)
+        except ValueError:
+            # let Python decide how values it can compare are ordered
+            distinct = sorted(set(_hashable(value) for value in values))
+            rank = {value: position for position, value in enumerate(distinct)}
+            return numpy.array([rank[_hashable(value)] for value in values],
+                               dtype=numpy.int64)
+    else:
+        _, ranks = numpy.unique(numpy.array(values), return_inverse=True)
+    return ranks.reshape(-1)
+
+
+def rank_matrix(metric_set: list, trees: list) -> 'numpy.ndarray':
+    """
+    Compute matrix of dense value ranks of BaseMetrics over trees.
+
+    Entry [b, t] is the rank of the value of the b-th BaseMetric for the
+    t-th tree among all values the BaseMetric assigns to trees. So for every
+    BaseMetric, the ranks of two trees compare like their values.
+
+    Parameters
+    ----------
+    metric_set: list
+        list of BaseMetric objects
+    trees: list
+        list of IOTrees; values of MetricTrees are stored in their value
+        tables
+    """
+    matrix = numpy.zeros((len(metric_set), len(trees)), dtype=numpy.int64)
+    for row, metric in enumerate(metric_set):
+        matrix[row] = _dense_ranks([_value(tree, metric) for tree in trees])
+    return matrix
+
+
+def _value(tree: 'IOTree', metric: 'BaseMetric'):
+    """Value of tree under BaseMetric, from the value table if possible"""
+    if isinstance(tree, MetricTree):
+        return tree.base_value(metric)
+    return metric.eval(tree)
+
+
+def sign_matrix(comp: 'ComparisonSet', metric_set: list) -> 'numpy.ndarray':
+    """
+    Compute how each BaseMetric fares on each contrast.
+
+    Entry [b, c] is -1 if the b-th BaseMetric assigns a smaller value to
+    the winner of the c-th Comparison than to its loser, 0 if it assigns
+    the same value to both, and 1 otherwise.
+
+    Parameters
+    ----------
+    comp: ComparisonSet
+        comparisons whose contrasts are to be evaluated
+    metric_set: list
+        list of BaseMetric objects
+    """
+    trees = []
+    position = {}
+    for comparison in comp.comparisons:
+        for tree in [comparison.winner, comparison.loser]:
+            if id(tree) not in position:
+                position[id(tree)] = len(trees)
+                trees.append(tree)
+
+    ranks = rank_matrix(metric_set, trees)
+    winners = [position[id(comparison.winner)]
+               for comparison in comp.comparisons]
+    losers = [position[id(comparison.loser)]
+              for comparison in comp.comparisons]
+    return numpy.sign(ranks[:, winners] - ranks[:, losers]).astype(numpy.int8)
+
+
+#######################
+#  Ranked Evaluation  #
+#######################
+
+def _digits(numbers: 'numpy.ndarray', base: int, ranks: int) -> list:
+    """Decode numbers of RankedMetrics into BaseMetric positions per rank"""
+    digits = []
+    for _ in range(ranks):
+        numbers, digit = numpy.divmod(numbers, base)
+        digits.append(digit)
+    digits.reverse()
+    return digits
+
+
+def outcome_chunks(comp: 'ComparisonSet', metric_set: list, ranks: int=1,
+                   start: int=0, stop: int=None,
+                   chunk_size: int=100000) -> 'iterable':
+    """
+    Generate outcome codes of RankedMetrics chunk by chunk.
+
+    Parameters
+    ----------
+    comp: ComparisonSet
+        comparisons to be evaluated
+    metric_set: list
+        list of BaseMetric objects
+    ranks: int
+        number of BaseMetrics per RankedMetric
+    start: int
+        number of first RankedMetric to be evaluated
+    stop: int
+        number of first RankedMetric not to be evaluated;
+        defaults to len(metric_set)**ranks
+    chunk_size: int
+        number of RankedMetrics per chunk
+
+    Yields
+    ------
+    (int, numpy.ndarray)
+        number of the first RankedMetric of the chunk, and an array of
+        outcome codes (SUCCESS, TIE, FAILURE) with one row per RankedMetric
+        and one column per Comparison
+    """
+    total = len(metric_set) ** ranks if ranks else 0
+    stop = total if stop is None else min(stop, total)
+    signs = sign_matrix(comp, metric_set)
+
+    for chunk_start in range(start, stop, chunk_size):
+        numbers = numpy.arange(chunk_start, min(chunk_start + chunk_size, stop))
+        digits = _digits(numbers, len(metric_set), ranks)
+        # first non-zero sign along the ranks
+        first = signs[digits[0]]
+        for digit in digits[1:]:
+            first = numpy.where(first != 0, first, signs[digit])
+        # -1 -> SUCCESS, 0 -> TIE, 1 -> FAILURE
+        yield chunk_start, (TIE - first).astype(numpy.int8)
+
+
+def outcomes(comp: 'ComparisonSet', metric_set: list, ranks: int=1,
+             start: int=0, stop: int=None,
+             chunk_size: int=100000) -> 'numpy.ndarray':
+    """
+    Compute outcome codes of RankedMetrics for all Comparisons.
+
+    See outcome_chunks for the parameters.
+
+    Returns
+    -------
+    numpy.ndarray
+        outcome codes with one row per RankedMetric in [start, stop)
+        and one column per Comparison
+
+    Examples
+    --------
+    >>> base_metrics = base_metrics_from_file('./metrics/filtered')
+    >>> comp = comparisons_from_file('./comparisons/rc_prom/AllSingleRCs',
+    >>>                              directory='./trees/rc_prom')
+    >>> codes = outcomes(comp, base_metrics, ranks=2)
+    """
+    chunks = [chunk for _, chunk in outcome_chunks(comp, metric_set, ranks,
+                                                    start, stop, chunk_size)]
+    if not chunks:
+        return numpy.zeros((0, len(comp.comparisons)), dtype=numpy.int8)
+    return numpy.concatenate(chunks)
+
+
+def tally(comp: 'ComparisonSet', metric_set: list, ranks: int=1,
+          start: int=0, stop: int=None, chunk_size: int=100000) -> dict:
+    """
+    Sort RankedMetrics into success, tie, and failure.
+
+    A RankedMetric's overall outcome is the worst of its outcomes over all
+    Comparisons. Only the numbers of the RankedMetrics are returned, so the
+    full outcome matrix is never held in memory at once.
+
+    See outcome_chunks for the parameters.
+
+    Returns
+    -------
+    dict
+        maps success, tie, and failure to arrays of RankedMetric numbers
+
+    Examples
+    --------
+    >>> result = tally(comp, base_metrics, ranks=3)
+    >>> [metric] = ranked_metrics(base_metrics, ranks=3,
+    >>>                           start=result['success'][0],
+    >>>                           stop=result['success'][0] + 1)
+    """
+    groups = {'success': [], 'tie': [], 'failure': []}
+    codes = {'success': SUCCESS, 'tie': TIE, 'failure': FAILURE}
+    for chunk_start, chunk in outcome_chunks(comp, metric_set, ranks,
+                                             start, stop, chunk_size):
+        if chunk.shape[1]:
+            overall = chunk.min(axis=1)
+        else:
+            overall = numpy.full(len(chunk), SUCCESS, dtype=numpy.int8)
+        for group, code in codes.items():
+            groups[group].append(numpy.flatnonzero(overall == code) +
+                                 chunk_start)
+    return {group: numpy.concatenate(numbers) if numbers
+            else numpy.zeros(0, dtype=numpy.int64)
+            for group, numbers in groups.items()}
+
+
+#############
+#  Margins  #
+#############
+
+def margin_matrix(comp: 'ComparisonSet', metric_set: list) -> 'numpy.ndarray':
+    """
+    Compute by how much each BaseMetric separates the trees of each contrast.
+
+    Entry [b, c] is the value of the b-th BaseMetric for the loser of the
+    c-th Comparison minus its value for the winner, so it is positive iff
+    the BaseMetric captures the contrast. List values are compared at the
+    first position in which their fixed-width encodings differ (see
+    encode_lists).
+
+    Parameters
+    ----------
+    comp: ComparisonSet
+        comparisons whose contrasts are to be evaluated
+    metric_set: list
+        list of BaseMetric objects
+    """
+    winners = [comparison.winner for comparison in comp.comparisons]
+    losers = [comparison.loser for comparison in comp.comparisons]
+    contrasts = len(comp.comparisons)
+
+    matrix = numpy.zeros((len(metric_set), contrasts))
+    for row, metric in enumerate(metric_set):
+        values = [_value(tree, metric) for tree in winners + losers]
+        if values and isinstance(values[0], (list, tuple)):
+            encoded = encode_lists(values)
+            difference = encoded[contrasts:] - encoded[:contrasts]
+            first = (difference != 0).argmax(axis=1)
+            matrix[row] = difference[numpy.arange(contrasts), first]
+        else:
+            matrix[row] = (numpy.array(values[contrasts:], dtype=float) -
+                           numpy.array(values[:contrasts], dtype=float))
+    return matrix
+
+
+def _chunk_margins(margins: 'numpy.ndarray', digits: list) -> 'numpy.ndarray':
+    """Sum of margins of the first distinguishing BaseMetric per contrast"""
+    first = margins[digits[0]]
+    for digit in digits[1:]:
+        first = numpy.where(first != 0, first, margins[digit])
+    return first.sum(axis=1)
+
+
+def _push_top(heap: list, k: int, totals: 'numpy.ndarray',
+              numbers: 'numpy.ndarray'):
+    """Add the k best (total, number) pairs of a chunk to bounded heap"""
+    if len(totals) > k:
+        best = numpy.argpartition(-totals, k - 1)[:k]
+    else:
+        best = numpy.arange(len(totals))
+    for pos in best:
+        # earlier metrics win ties
+        item = (float(totals[pos]), -int(numbers[pos]))
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+
+def _sorted_top(heap: list) -> list:
+    return [(total, -negative) for total, negative in sorted(heap,
+                                                              reverse=True)]
+
+
+def top_margins(comp: 'ComparisonSet', metric_set: list, ranks: int=1,
+                k: int=10, start: int=0, stop: int=None,
+                chunk_size: int=100000) -> list:
+    """
+    Find the RankedMetrics with the largest total margin.
+
+    The margin of a RankedMetric for a contrast is the margin (see
+    margin_matrix) of its first BaseMetric that does not assign the same
+    value to winner and loser, and 0 if there is none. Margins are summed
+    over all Comparisons. Only a chunk of RankedMetrics and a heap of the
+    k best ones are held in memory at any time.
+
+    See outcome_chunks for the remaining parameters.
+
+    Returns
+    -------
+    list
+        (total margin, number of RankedMetric) pairs, best first
+
+    Examples
+    --------
+    >>> top_margins(comp, base_metrics, ranks=2, k=3)
+    [(69.0, 1989), (67.0, 549), (67.0, 1988)]
+    """
+    total = len(metric_set) ** ranks if ranks else 0
+    stop = total if stop is None else min(stop, total)
+    margins = margin_matrix(comp, metric_set)
+
+    heap = []
+    for chunk_start in range(start, stop, chunk_size):
+        numbers = numpy.arange(chunk_start, min(chunk_start + chunk_size, stop))
+        digits = _digits(numbers, len(metric_set), ranks)
+        _push_top(heap, k, _chunk_margins(margins, digits), numbers)
+    return _sorted_top(heap)
+
+
+def top_margins_of(comp: 'ComparisonSet', metrics: list, k: int=10,
+                   chunk_size: int=100000) -> list:
+    """
+    Find the members of a list of RankedMetrics with the largest total margin.
+
+    Like top_margins, but for arbitrary RankedMetrics, e.g. those of a
+    ComparisonSet. RankedMetrics of lower rank are padded with a BaseMetric
+    that never distinguishes any trees.
+
+    Returns
+    -------
+    list
+        (total margin, position of RankedMetric in metrics) pairs, best first
+    """
+    metric_set = []
+    position = {}
+    for metric in metrics:
+        for base_metric in metric.metrics:
+            if base_metric not in position:
+                position[base_metric] = len(metric_set)
+                metric_set.append(base_metric)
+    ranks = max([len(metric.metrics) for metric in metrics], default=0)
+    # last row: padding for RankedMetrics of lower rank
+    margins = numpy.vstack([margin_matrix(comp, metric_set),
+                            numpy.zeros((1, len(comp.comparisons)))])
+
+    heap = []
+    for chunk_start in range(0, len(metrics), chunk_size):
+        chunk = metrics[chunk_start:chunk_start + chunk_size]
+        table = numpy.full((len(chunk), ranks), len(metric_set))
+        for row, metric in enumerate(chunk):
+            table[row, :len(metric.metrics)] = [position[base_metric]
+                                                for base_metric
+                                                in metric.metrics]
+        numbers = numpy.arange(chunk_start, chunk_start + len(chunk))
+        if ranks:
+            _push_top(heap, k, _chunk_margins(margins, list(table.T)),
+                      numbers)
+    return _sorted_top(heap)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This file defines memory accounting for ComparisonSets.
+#
+# - footprint walks a ComparisonSet and reports how many bytes are taken up
+#   by its trees, their nodes, the profiles of the trees, the metric
+#   objects, the profiles of the metrics, and the sets of successful,
+#   tie-ing, and failing metrics
+#
+# - estimate predicts these numbers from the number of BaseMetrics, the
+#   rank, the number of comparisons, and the size of the trees before
+#   anything is built,
+#   preflight refuses runs that would exceed a memory budget, and
+#   shard_size computes how many metrics fit into a budget at once
+#
+# Every object is counted only once, in the first category that reaches it.
+# Sizes are deep sizes as reported by sys.getsizeof, so they are a lower
+# bound on the memory actually used by the Python interpreter.
+
+import sys
+import types
+
+from metrics import BaseMetric, RankedMetric, SUCCESS,\
+    _construct_metrics_from_text
+from tree_files import tree_from_text
+
+
+# objects that are shared by the whole program rather than owned by data
+_shared_types = (type, types.ModuleType, types.FunctionType,
+                 types.BuiltinFunctionType, types.MethodType)
+
+CATEGORIES = ['trees', 'nodes', 'tree profiles', 'metrics',
+              'metric profiles', 'result sets', 'other']
+
+
+##################
+#  Deep Sizes    #
+##################
+
+def deep_size(obj, seen: set=None, boundary: set=frozenset(),
+              skip: tuple=()) -> int:
+    """
+    Compute number of bytes taken up by obj and everything it references.
+
+    Parameters
+    ----------
+    obj: object
+        object to be measured
+    seen: set
+        ids of objects that have already been counted; updated in place.
+        The objects must stay alive as long as seen is used, as the ids
+        of dead objects are reused for new ones.
+    boundary: set
+        ids of objects that are not to be counted or entered, unless they
+        are obj itself
+    skip: tuple
+        names of attributes of obj that are not to be entered
+
+    Examples
+    --------
+    >>> deep_size([1, 2, 3]) > sys.getsizeof([1, 2, 3])
+    True
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [(obj, True)]
+    while stack:
+        current, root = stack.pop()
+        if id(current) in seen or isinstance(current, _shared_types):
+            continue
+        if not root and id(current) in boundary:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            for key, value in current.items():
+                stack.append((key, False))
+                stack.append((value, False))
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend((item, False) for item in current)
+        elif hasattr(current, '__dict__'):
+            attributes = vars(current)
+            if root and skip:
+                # count the attribute dictionary, but not what is skipped
+                seen.add(id(attributes))
+                size += sys.getsizeof(attributes)
+                for key, value in attributes.items():
+                    stack.append((key, False))
+                    if key not in skip:
+                        stack.append((value, False))
+            else:
+                stack.append((attributes, False))
+    return size
+
+
+def footprint(comp: 'ComparisonSet') -> dict:
+    """
+    Report memory usage of ComparisonSet by category.
+
+    Returns
+    -------
+    dict
+        maps each category in CATEGORIES to a number of bytes, and total to
+        their sum
+
+    Examples
+    --------
+    >>> metrics = metrics_from_file('./metrics/filtered', ranks=2)
+    >>> comp = comparisons_from_file('./comparisons/rc_prom/AllSingleRCs',
+    >>>                              directory='./trees/rc_prom',
+    >>>                              metrics=metrics)
+    >>> footprint(comp)['metric profiles']
+    17367102
+    """
+    trees = []
+    for tree in comp.trees(update=True):
+        if not any(tree is other for other in trees):
+            trees.append(tree)
+    nodes = [node for tree in trees for node in tree.struct.values()]
+    metrics = list(comp.metrics)
+    base_metrics = {id(base_metric): base_metric
+                    for metric in metrics
+                    for base_metric in metric.metrics}
+
+    # objects that belong to a category of their own
+    boundary = {id(obj) for obj in trees + nodes + metrics}
+    boundary.update(base_metrics)
+    seen = set()
+    report = dict.fromkeys(CATEGORIES, 0)
+
+    for node in nodes:
+        report['nodes'] += deep_size(node, seen, boundary)
+    # attributes that are missing are skipped rather than replaced by
+    # temporary objects, since the ids of those would be reused
+    for tree in trees:
+        report['trees'] += deep_size(tree, seen, boundary,
+                                     skip=('profile', 'values'))
+        for attribute in ['profile', 'values']:
+            if hasattr(tree, attribute):
+                report['tree profiles'] += deep_size(
+                    getattr(tree, attribute), seen, boundary)
+    for metric in metrics:
+        report['metrics'] += deep_size(
+            metric, seen, boundary,
+            skip=('_profile', '_outcomes', '_contrasts'))
+        for attribute in ['_profile', '_outcomes', '_contrasts']:
+            if hasattr(metric, attribute):
+                report['metric profiles'] += deep_size(
+                    getattr(metric, attribute), seen, boundary)
+    for base_metric in base_metrics.values():
+        report['metrics'] += deep_size(base_metric, seen, boundary)
+
+    result_sets = [comp.success, comp.tie, comp.failure]
+    for comparison in comp.comparisons:
+        result_sets += [comparison.success, comparison.tie, comparison.failure]
+    for result_set in result_sets:
+        report['result sets'] += deep_size(result_set, seen, boundary)
+
+    report['other'] += deep_size(comp, seen, boundary)
+    report['total'] = sum(report[category] for category in CATEGORIES)
+    return report
+
+
+###############
+#  Estimates  #
+###############
+
+def _per_item(build: 'function', count: int) -> float:
+    """Average number of bytes per item of a container with count items"""
+    sample = build(range(min(count, 1 << 16)))
+    if not sample:
+        return 0
+    return sys.getsizeof(sample) / len(sample)
+
+
+def _sample_tree(nodes: int) -> (int, int):
+    """Measure size of a MetricTree and of its nodes"""
+    # right-branching tree [XP [Y] [XP [Y] ... [X]]]
+    text = '[X]'
+    for _ in range(max(0, nodes - 1) // 2):
+        text = '[XP [Y] {0}]'.format(text)
+    tree = tree_from_text(text, name='sample')
+    # fill the caches that are filled when metrics are evaluated
+    for load_type in ['tenure', 'size']:
+        for trivial in [True, False]:
+            BaseMetric(load_type=load_type, operator=sum,
+                       trivial=trivial).eval(tree)
+
+    struct = list(tree.struct.values())
+    seen = set()
+    boundary = {id(node) for node in struct}
+    node_size = sum(deep_size(node, seen, boundary) for node in struct)
+    tree_size = deep_size(tree, seen, boundary, skip=('profile', 'values'))
+    # scale to the requested number of nodes
+    return (tree_size * nodes // len(struct),
+            node_size * nodes // len(struct))
+
+
+def _sample_metric(ranks: int, comparisons: int,
+                   compact: bool) -> (int, int, int):
+    """
+    Measure size of a BaseMetric, a RankedMetric, and the latter's profile.
+
+    Two metrics of each kind are built, and only the second one is
+    measured, so that strings and other objects shared by all metrics are
+    not counted.
+    """
+    seen = set()
+    base_metrics = []
+    for rank in range(max(ranks, 2)):
+        # built like the BaseMetrics of a *.metrics file
+        line = 'M{0}; \\M{0}; tenure; sum; ; ;'.format(rank)
+        base_metrics.extend(_construct_metrics_from_text(line.split(';')))
+        base = deep_size(base_metrics[-1], seen)
+
+    tree = object()
+    # values are stored in the profiles of the trees
+    value = [10] * ranks
+    contrasts = {} if compact else None
+    names = ['contrast-{0}'.format(number) for number in range(comparisons)]
+
+    # trees, BaseMetrics, and contrast names are shared with other metrics
+    boundary = {id(obj) for obj in [tree, value] + base_metrics}
+    boundary.update(id(name) for name in names)
+    samples = []
+    for _ in range(2):
+        metric = RankedMetric(tuple(base_metrics[:ranks]), compact=compact,
+                              contrasts=contrasts)
+        for name in names:
+            if compact:
+                metric._contrasts[name] = (tree, tree)
+                metric._outcomes[name] = SUCCESS
+            else:
+                metric._profile[name] = {
+                    'name': name,
+                    'desired winner': (tree, 'winner', value),
+                    'desired loser': (tree, 'loser', value),
+                    'captured': (True, True)}
+            metric.viable = metric._pair_and(metric.viable, (True, True))
+        size = deep_size(metric, seen, boundary,
+                         skip=('_profile', '_outcomes', '_contrasts'))
+        profile = deep_size(metric._outcomes if compact else metric._profile,
+                            seen, boundary)
+        samples.append((metric, size, profile))
+    return (base,) + samples[-1][1:]
+
+
+def _sample_entry(ranks: int) -> int:
+    """Measure size of the entry of a RankedMetric in a tree profile"""
+    name = 'M0 > M1'
+    seen = set()
+    entries = []
+    for _ in range(2):
+        entries.append({'name': name, 'value': [10] * ranks})
+        size = deep_size(entries[-1], seen, {id(name)})
+    return size
+
+
+def estimate(base_metrics: int, ranks: int, comparisons: int,
+             compact: bool=False, trees: int=None, nodes: int=40) -> dict:
+    """
+    Estimate memory usage of a sweep before running it.
+
+    The sizes of RankedMetrics, trees, and their profiles are measured on
+    small samples and scaled up. Result sets are assumed to hold all
+    RankedMetrics in a single set per comparison, so they are slightly
+    overestimated. Compared to footprint, the estimate is usually within
+    25% of the total.
+
+    Parameters
+    ----------
+    base_metrics: int
+        number of BaseMetrics
+    ranks: int
+        rank of the RankedMetrics
+    comparisons: int
+        number of comparisons
+    compact: bool
+        whether compact RankedMetrics are used
+    trees: int
+        number of distinct trees; defaults to 2 * comparisons
+    nodes: int
+        average number of nodes per tree
+
+    Returns
+    -------
+    dict
+        maps categories to estimated numbers of bytes, total to their sum,
+        and count to the number of RankedMetrics
+
+    Examples
+    --------
+    >>> estimate(90, 3, 6)['count']
+    729000
+    """
+    count = base_metrics ** ranks
+    if trees is None:
+        trees = 2 * comparisons
+    report = dict.fromkeys(CATEGORIES, 0)
+
+    tree, node = _sample_tree(nodes)
+    report['trees'] = trees * tree
+    report['nodes'] = trees * node
+
+    base, metric, profile = _sample_metric(ranks, comparisons, compact)
+    report['metrics'] = base_metrics * base + count * metric
+    report['metric profiles'] = count * profile
+
+    # every tree has a value table with one value per BaseMetric...
+    table = sys.getsizeof(dict.fromkeys(range(base_metrics))) +\
+        base_metrics * sys.getsizeof(0.5)
+    report['tree profiles'] = trees * table
+    if not compact:
+        # ... and full metrics also store their value in its profile
+        entry = _sample_entry(ranks) + _per_item(dict.fromkeys, count)
+        report['tree profiles'] += int(count * trees * entry)
+
+    # every metric is in one result set per comparison, plus the overall
+    # ones, and in the list of metrics of the ComparisonSet
+    result_sets = 2 * sys.getsizeof(set()) + count * _per_item(set, count)
+    report['result sets'] = int((comparisons + 1) * result_sets)
+    report['other'] = int(count * _per_item(list, count))
+    report['total'] = sum(report[category] for category in CATEGORIES)
+    report['count'] = count
+    return report
+
+
+def preflight(base_metrics: int, ranks: int, comparisons: int,
+              budget: int, compact: bool=False, trees: int=None) -> dict:
+    """
+    Refuse a sweep whose estimated memory usage exceeds budget.
+
+    See estimate for the parameters; budget is given in bytes.
+
+    Returns
+    -------
+    dict
+        the estimate, if it is within budget
+
+    Raises
+    ------
+    Exception
+        if the estimate exceeds budget
+
+    Examples
+    --------
+    >>> preflight(len(base_metrics), 3, len(comp.comparisons),
+    >>>           budget=4 * 2**30)
+    """
+    report = estimate(base_metrics, ranks, comparisons,
+                      compact=compact, trees=trees)
+    if report['total'] > budget:
+        message = 'Estimated memory usage of {0:.1f} MB for {1} metrics\n\
+exceeds budget of {2:.1f} MB; use compact metrics or split the run into shards'
+        raise Exception(message.format(report['total'] / 2**20,
+                                       report['count'], budget / 2**20))
+    return report
+
+
+def shard_size(base_metrics: int, ranks: int, comparisons: int,
+               budget: int, compact: bool=True, trees: int=None) -> int:
+    """
+    Compute number of RankedMetrics per shard that fits into budget.
+
+    See estimate for the parameters; budget is given in bytes.
+
+    Examples
+    --------
+    >>> shard_size(90, 4, 6, budget=2**30)
+    981454
+    """
+    report = estimate(base_metrics, ranks, comparisons,
+                      compact=compact, trees=trees)
+    if not report['count']:
+        return 1
+    per_metric = report['total'] / report['count']
+    return max(1, int(budget // per_metric))
@@ -12,8 +12,9 @@
 # Fixme: document this module very carefully (extended docstrings, examples)
 
 
-import re
+import io
 import pprint
+import sys
 from collections import OrderedDict
 from helpers import int2str, ascii, named
 
@@ -83,6 +84,8 @@ class GornTree:
         # dictionary of nodes by name for quick lookup
         self.names = {}
 
+        # mover table: address of each mover to its movement dictionary
+        # (target address: feature); kept up to date by add and add_mover
         self.movement = {}
 
         # fill up self.struct with arguments, if specified
@@ -137,6 +140,9 @@ class GornTree:
         """
         self.struct[gorn_node.address] = gorn_node
         self.names[gorn_node._name] = gorn_node
+        if gorn_node.movement:
+            self.movement[gorn_node.address] = gorn_node.movement
+            self._movement_changed()
 
         # fixme: what is this good for? adding nodes in between others?
         if after:
@@ -171,8 +177,13 @@ class GornTree:
             else:
                 self._linear.pop(pos)
 
-        # remove node from tree structure
-        self.struct.pop(address, {})
+        # remove node from tree structure and indices
+        node = self.struct.pop(address, None)
+        if node is not None:
+            if self.names.get(node._name) is node:
+                self.names.pop(node._name)
+            if self.movement.pop(address, None) is not None:
+                self._movement_changed()
 
     @int2str
     def sentence(self, *args) -> list:
@@ -194,33 +205,64 @@ class GornTree:
     @int2str
     def add_mover(self, source: str, target: str, feature: str,
                   update_tree: bool=True):
-        """Add movement information to a node"""
+        """
+        Add movement information to a node.
+
+        The mover table self.movement is updated right away, so this takes
+        constant time. With update_tree=False, subclasses are not notified
+        of the change (see _movement_changed); add_movers uses this to
+        notify them only once for a whole batch of movers.
+
+        Parameters
+        ----------
+        source : str
+            address or name of mover
+        target : str
+            address or name of landing site
+        feature : str
+            feature that triggers the movement step
+        """
         # convert name to address if necessary
         source = self.produce_address(source)
         target = self.produce_address(target)
 
-        self.struct[source].moves_to(target, feature)
+        node = self.struct[source]
+        node.moves_to(target, feature)
+        self.movement[source] = node.movement
         if update_tree:
-            self.update_movers
+            self._movement_changed()
 
     def update_movers(self):
-        for node in self.struct.values():
-            if node.movement:
-                self.movement[node.address] = node.movement
+        """
+        Rebuild the mover table from the nodes.
+
+        This is only needed if the movement of nodes has been changed
+        directly with GornNode.moves_to rather than with add_mover.
+        """
+        self.movement = {node.address: node.movement
+                         for node in self.struct.values()
+                         if node.movement}
+        self._movement_changed()
 
     def add_movers(self, movement: list):
+        """Add list of (source, target, feature) triples"""
         for source, target, feature in movement:
             self.add_mover(source, target, feature, update_tree=False)
-        self.update_movers()
+        self._movement_changed()
+
+    def _movement_changed(self):
+        """Hook for subclasses that cache values depending on movement"""
+        pass
 
 
     ###################
     #  Getting Nodes  #
     ###################
 
-    def produce_address(self, name: 'str'):
-        match = re.match(r'[0-9]*', str(name))
-        if match.group(0):
+    def produce_address(self, name: 'str') -> str:
+        """Return address of node, which may be given by name or address"""
+        name = str(name)
+        if name in self.struct:
             return name
         else:
             return self.names[name].address
@@ -249,7 +291,7 @@ class GornTree:
         ['1314', '131', '13', '1', '']
         """
         # safety check the node address
-        if address not in self.addresses():
+        if address not in self.struct:
             raise Exception('Node does not exist')
 
         # non-safe: ancestors are all address prefixes
@@ -257,7 +299,7 @@ class GornTree:
         # safe: throw away non-existant ancestors
         if safe:
             ancestors = [ancestor for ancestor in ancestors
-                         if ancestor in self.addresses()]
+                         if ancestor in self.struct]
         return ancestors
 
     @int2str
@@ -438,6 +480,58 @@ class GornTree:
     def show_leaves(self, listing: bool=True):
         print(self.leaf_parts(listing))
 
+    def _daughter_table(self) -> dict:
+        """Map each address to the sorted addresses of its daughters"""
+        table = {}
+        for address in sorted(self.struct):
+            if address != '':
+                table.setdefault(address[:-1], []).append(address)
+        return table
+
+    def write(self, handle, annotation: 'labeling'=ascii, address: str='',
+              indent: int=0, tabwidth: int=4, whitespace: str=' '):
+        """
+        Write (sub)tree to file handle, in the format of .print.
+
+        The tree is traversed iteratively rather than recursively, so that
+        arbitrarily deep trees can be written. Every node is visited exactly
+        once, and its bracketing is written right away.
+
+        Parameters
+        ----------
+        handle : file
+            file handle (or io.StringIO) to write to
+        address, indent, tabwidth, whitespace, annotation :
+            see .print
+        """
+        daughters = self._daughter_table()
+        # stack of nodes (address, depth) still to be written
+        # and closing brackets (str)
+        stack = [(str(address), indent)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                handle.write(item)
+                continue
+
+            address, indent = item
+            # compute label of current node
+            label = annotation(self, address)
+            # set appropriate offset per indentation level
+            offset = whitespace * (tabwidth * indent)
+
+            if address not in daughters:
+                handle.write(offset + '[' + label + ']')
+            else:
+                handle.write(offset + '[' + label + '\n')
+                # daughters are put on the stack in reverse order,
+                # separated by line breaks
+                stack.append('\n' + offset + ']')
+                for pos, daughter in enumerate(reversed(daughters[address])):
+                    if pos:
+                        stack.append('\n')
+                    stack.append((daughter, indent + 1))
+
     def print(self, annotation: 'labeling'=ascii, address: str='',
               indent: int=0, tabwidth: int=4, whitespace: str=' ') -> str:
         """
@@ -456,29 +550,15 @@ class GornTree:
         annotation : function
             function for typesetting node labels
         """
-        # compute label of current node
-        label = annotation(self, address)
-        # set appropriate offset per indentation level
-        offset = whitespace * (tabwidth * indent)
-
-        # the rest of the function uses recursion;
-        # first the base case: current node is a leaf
-        if self.is_leaf(address):
-            return offset + '[' + label + ']'
-        # and now the recursion:
-        # center embed strings computed for the daughters
-        else:
-            start = offset + '[' + label + '\n'
-            end = '\n' + offset + ']'
-            middle = [self.print(annotation, daughter,
-                                 indent+1, tabwidth, whitespace)
-                      for daughter in self.daughters(address)]
-            return start + '\n'.join(middle) + end
+        buffer = io.StringIO()
+        self.write(buffer, annotation, address, indent, tabwidth, whitespace)
+        return buffer.getvalue()
 
     def pprint(self, annotation: 'labeling'=ascii, address: str='',
               indent: int=0, tabwidth: int=4, whitespace: str=' ') -> str:
-        print(self.print(annotation, address, indent, tabwidth, whitespace))
-
+        self.write(sys.stdout, annotation, address, indent, tabwidth,
+                   whitespace)
+        sys.stdout.write('\n')
 
 
     ###################
@@ -487,19 +567,19 @@ class GornTree:
 
     def is_mother_closed(self) -> bool:
         """Ensure Gorn domain is prefix/mother-of closed."""
-        for node in self.addresses():
+        for node in self.struct:
             # check everything but the root
             if len(node) >= 1 and\
-               node[:-1] not in self.addresses():
+               node[:-1] not in self.struct:
                 return False
         return True
 
     def is_left_sibling_closed(self) -> bool:
         """Ensure Gorn domain is left-sibling closed."""
-        for node in self.addresses():
+        for node in self.struct:
             if node != '':
                 for branch in range(1, int(node[-1])):
-                    if node[:-1] + str(branch) not in self.addresses():
+                    if node[:-1] + str(branch) not in self.struct:
                         return False
         return True
 
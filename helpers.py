@@ -15,8 +15,11 @@
 #   named: ascii with tikz names for nodes
 #   forest: forest output (with \Lab macro)
 #   ioprint: writes index/outdex annotation as *.io.forest file
+#   moveprint: writes move arcs of a tree as *.move.forest file
+#   texprint: writes complete forest environment as *.mgproc.forest file
 
 import os
+from io import StringIO
 
 
 def int2str(function) -> 'function':
@@ -96,10 +99,8 @@ def forest(tree: 'IOTree', address: str, macros: bool=False) -> str:
             )
 
 
-def ioprint(tree: 'IOTree', extension: str='.io.forest',
-            filename: str=None, directory: str=None) -> str:
-    """Prints index/outdex annotation as tikz nodes."""
-    string = ''
+def _write_io(tree: 'IOTree', handle):
+    """Write index/outdex annotation as tikz nodes to file handle."""
     command_padding = 24
     label_padding = 24
     node_padding = 5
@@ -119,33 +120,123 @@ def ioprint(tree: 'IOTree', extension: str='.io.forest',
         outdex_string += 'at {0} {1};\n'.format(node_name, node_outdex)
 
         # put them together
-        string += index_string + outdex_string + '%\n'
+        handle.write(index_string + outdex_string + '%\n')
 
     # forest chokes on empty lines,
     # so add a % after the very last \n
-    string += '%'
+    handle.write('%')
+
+
+def ioprint(tree: 'IOTree', extension: str='.io.forest',
+            filename: str=None, directory: str=None,
+            handle=None) -> str:
+    """
+    Prints index/outdex annotation as tikz nodes.
 
-    if not filename:
-        return string
+    The code is returned as a string, unless a filename or an open file
+    handle is specified, in which case it is written there directly.
+    """
+    if handle is not None:
+        _write_io(tree, handle)
+    elif not filename:
+        buffer = StringIO()
+        _write_io(tree, buffer)
+        return buffer.getvalue()
     else:
         if not directory:
             directory = '.'
         filename += extension
         filename = os.path.join(directory, filename)
         with open(filename, 'w') as text_file:
-            print(string, file=text_file)
+            _write_io(tree, text_file)
+            text_file.write('\n')
+
+
+def _write_moves(tree: 'GornTree', handle):
+    """Write move arcs as tikz draw commands to file handle."""
+    for source, movement in tree.movement.items():
+        source_name = '(' + tree.struct[source].name() + ')'
+        final = next(reversed(movement))
+        for target, feature in movement.items():
+            # intermediate landing sites are drawn in a lighter style
+            style = '' if target == final else ', non-final'
+            handle.write(
+                '\\draw[move={{{0}}}{1}] {2} to[out=west,in=south west] '
+                '({3});\n'.format(feature, style, source_name,
+                                  tree.struct[target].name()))
+
+
+def moveprint(tree: 'GornTree', extension: str='.move.forest',
+              filename: str=None, directory: str=None,
+              handle=None) -> str:
+    """
+    Prints move arcs of tree as tikz draw commands.
+
+    The arcs are built from the mover table of the tree, one per movement
+    step, so no *.move.forest file is needed. The code is returned as a
+    string, unless a filename or an open file handle is specified.
+    """
+    if handle is not None:
+        _write_moves(tree, handle)
+    elif not filename:
+        buffer = StringIO()
+        _write_moves(tree, buffer)
+        return buffer.getvalue()
+    else:
+        if not directory:
+            directory = '.'
+        filename += extension
+        filename = os.path.join(directory, filename)
+        with open(filename, 'w') as text_file:
+            _write_moves(tree, text_file)
+
+
+def _write_tex(tree: 'IOTree', handle, tree_directory: str=None,
+               io: bool=True, arcs: str='tree'):
+    """Write forest environment for tree to file handle."""
+    handle.write('\\begin{forest}')
+    tree_header = '\n%\n' + '%' * 8 + '\n% Tree %\n' + '%' * 8
+    handle.write(tree_header + '\n%\n')
+    tree.write(handle, annotation=forest)
+
+    # add move specification
+    move_header = '%' * 10 + '\n% Movers %\n' + '%' * 10
+    move_code = None
+    if arcs == 'file':
+        move = os.path.join(tree_directory, tree.name) if tree_directory else tree.name
+        try:
+            with open(move + '.move.forest', 'r') as move_file:
+                move_code = move_file.read()
+                move_file.close()
+        except OSError:
+            pass
+    # build move arcs from the tree if there is no file to use
+    if move_code is None and tree.movement:
+        move_code = moveprint(tree)
+    if move_code is not None:
+        handle.write('\n%\n' + move_header + '\n%\n' + move_code + '%')
+
+    # add index/outdex annotation if requested
+    if io:
+        io_header = '%' * 15 + '\n% Annotations %\n' + '%' * 15
+        handle.write('\n' + io_header + '\n%\n')
+        _write_io(tree, handle)
+
+    # and close the forest environment
+    handle.write('\n\\end{forest}')
 
 
 def texprint(tree: 'IOTree', extension: str='.mgproc.forest',
              filename: str=None, directory: str=None,
              tree_directory: str=None,
-             io: bool=True) -> str:
+             io: bool=True, handle=None, arcs: str='tree') -> str:
     """
     Prints forest output of tree.
     
     This function outputs a complete forest environment describing the full
     structure of the tree, all the move arcs, and (if desired) the index/
-    outdex annotation.
+    outdex annotation. The output is written piece by piece to a file or
+    file handle if one is specified, and returned as a string otherwise.
 
     Parameters
     ----------
@@ -158,35 +249,22 @@ def texprint(tree: 'IOTree', extension: str='.mgproc.forest',
     directory: str
         directory in which to save the file
     tree_directory: str
-        directory in which tree files are saved
+        directory in which tree files are saved; only needed with arcs='file'
     io: bool
         add code for index/outdex annotation?
+    handle: file
+        open file handle to write to; filename and directory are ignored
+    arcs: str
+        tree: build move arcs from the movement of the tree (see moveprint)
+        file: copy the hand-drawn arcs from the tree's *.move.forest file,
+              if there is one
     """
-    string = '\\begin{forest}'
-    tree_header = '\n%\n' + '%' * 8 + '\n% Tree %\n' + '%' * 8
-    string += tree_header + '\n%\n' + tree.print(annotation=forest)
-
-    # add move specification
-    move = os.path.join(tree_directory, tree.name) if tree_directory else tree.name
-    move_header = '%' * 10 + '\n% Movers %\n' + '%' * 10
-    try:
-        with open(move + '.move.forest', 'r') as move_file:
-            string += '\n%\n' + move_header + '\n%\n' + move_file.read() + '%'
-            move_file.close()
-    except:
-        pass
-        # fixme: construct move code directly from IOTree
-
-    # add index/outdex annotation if requested
-    if io:
-        io_header = '%' * 15 + '\n% Annotations %\n' + '%' * 15
-        string += '\n' + io_header + '\n%\n' + ioprint(tree)
-
-    # and close the forest environment
-    string += '\n\\end{forest}'
-
-    if not filename:
-        return string
+    if handle is not None:
+        _write_tex(tree, handle, tree_directory, io, arcs)
+    elif not filename:
+        buffer = StringIO()
+        _write_tex(tree, buffer, tree_directory, io, arcs)
+        return buffer.getvalue()
     else:
         if io:
             filename += '.io'
@@ -195,4 +273,5 @@ def texprint(tree: 'IOTree', extension: str='.mgproc.forest',
             directory = '.'
         filename = os.path.join(directory, filename)
         with open(filename, "w") as text_file:
-            print(string, file=text_file)
+            _write_tex(tree, text_file, tree_directory, io, arcs)
+            text_file.write('\n')
@@ -16,6 +16,8 @@
 # is an IOTree that also stores information about the values it receives
 # from various metrics.
 
+import sys
+
 from gorn_tree import GornNode, GornTree
 from helpers import forest
 
@@ -55,17 +57,23 @@ class IONode(GornNode):
                          content=content)
         self._index = index
         self._outdex = outdex
+        # tree that still has to annotate this node (see IOTree lazy mode)
+        self._tree = None
 
     def index(self, index: int=None):
         if index:
             self._index = index
         else:
+            if self._tree is not None:
+                self._tree.ensure_parsed()
             return self._index
 
     def outdex(self, outdex: int=None):
         if outdex:
             self._outdex = outdex
         else:
+            if self._tree is not None:
+                self._tree.ensure_parsed()
             return self._outdex
 
     def tenure(self):
@@ -87,13 +95,36 @@ class IOTree(GornTree):
     --------------
     .parse:
         add index/outdex annotation and set leaf/empty status for all nodes
+    .ensure_parsed:
+        parse tree unless this has already happened
+    .tenures: dict
+        tenure values of all nodes by node type, computed by .parse
+        (see tree_values.tenure_histogram)
     .fprint:
         print forest code for tree (with \Lab macros)
+
+    Lazy Construction
+    -----------------
+    By default, a tree is parsed as soon as it is built. With lazy=True,
+    parsing is deferred until the index or outdex of one of its nodes is
+    requested, or until a memory value is computed for the tree. Trees that
+    are never evaluated are thus never parsed.
+
+    With check=True, the tree is only parsed if its Gorn domain is
+    consistent (see GornTree.is_consistent); with check=False, this check
+    is skipped.
     """
     # we initialize almost everything ourselves and only pass name to
     # the GornTree init function
     def __init__(self, *args: tuple,
-                 leaf_order: list=None, movement: list=None, name: str=''):
+                 leaf_order: list=None, movement: list=None, name: str='',
+                 lazy: bool=False, check: bool=True):
+        # size values per (filters, trivial), see tree_values.move_extract
+        self._sizes = {}
+        # tenure values by node type, see tree_values.tenure_histogram
+        self.tenures = None
+        self._parsed = False
+        self._check = check
         super().__init__(name=name)
 
         # fill up self.struct with arguments, if specified
@@ -111,8 +142,16 @@ class IOTree(GornTree):
         elif '' in self.addresses():
             self.sentence(*self.leaves())
 
-        if self.is_consistent():
-            self.parse()
+        # leaf/empty status does not depend on the annotation, so it is
+        # available right away even if parsing is deferred
+        self._set_status()
+
+        if lazy:
+            # nodes trigger parsing when their annotation is needed
+            for node in self.struct.values():
+                node._tree = self
+        else:
+            self.ensure_parsed()
 
         if movement:
             self.add_movers(movement)
@@ -183,20 +222,51 @@ Example: tree.sentence(231, 232, 11, 12, 21, 221)
 
     def _set_status(self) -> 'IOTree':
         """Set the flags "leaf" and "empty' for each node"""
+        mothers = {address[:-1] for address in self.struct if address}
         for address in self.struct:
-            if self.has_daughters(address):
+            if address in mothers:
                 self.struct[address].leaf = False
                 self.struct[address].empty = False
             else:
                 self.struct[address].leaf = True
 
     def parse(self) -> 'IOTree':
+        # mark tree as parsed first, lest the annotation code trigger
+        # parsing again via the nodes of a lazy tree
+        self._parsed = True
+        for node in self.struct.values():
+            node._tree = None
         self._annotate()
         self._set_status()
+        self._sizes.clear()
+        # imported here since tree_values itself depends on this module
+        from tree_values import tenure_histogram
+        self.tenures = tenure_histogram(self)
+
+    def ensure_parsed(self) -> 'IOTree':
+        """Parse tree unless it has been parsed already"""
+        if self._parsed:
+            return
+        if not self._check or self.is_consistent():
+            self.parse()
+        else:
+            # do not check (and complain) again on every access
+            self._parsed = True
+            for node in self.struct.values():
+                node._tree = None
+
+    def _movement_changed(self):
+        """Discard size values cached by tree_values.move_extract"""
+        self._sizes.clear()
 
     def fprint(self, annotation: 'labeling'=forest, address: str='',
-              indent: int=0, tabwidth: int=4, whitespace: str=' ') -> str:
-        print(self.print(annotation, address, indent, tabwidth, whitespace))
+              indent: int=0, tabwidth: int=4, whitespace: str=' ',
+              handle=None) -> str:
+        """Print forest code for tree, or write it to file handle"""
+        if handle is None:
+            handle = sys.stdout
+        self.write(handle, annotation, address, indent, tabwidth, whitespace)
+        handle.write('\n')
 
 
 #############
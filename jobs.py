@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This file defines a batch runner for comparisons. A *.jobs file lists any
+# number of jobs, each of which runs one *.compare file against one *.metrics
+# file with a given number of ranks and writes the results to a file.
+#
+# Every *.metrics file is read only once, and every tree is built only once,
+# no matter how many jobs use it. The jobs themselves are run concurrently
+# on a pool of worker processes (or threads).
+#
+# evaluate_metrics distributes a single, large set of RankedMetrics over
+# worker processes instead. The RankedMetrics are sent to the workers in
+# packed form (see metrics.pack_metrics), and the workers return arrays of
+# outcome codes.
+#
+# evaluate_sharded splits all RankedMetrics of a given rank into shards,
+# i.e. ranges of their numbers in the order of _construct_ranked_metric,
+# whose size can be derived from a memory budget (see footprint.py). Only
+# the bounds of each shard are sent to the workers, and the results of all
+# shards are collected into a single ComparisonSet.
+
+import array
+import concurrent.futures
+import os
+import re
+
+from metrics import base_metrics_from_file, _construct_ranked_metric,\
+    pack_metrics, unpack_metrics, ranked_metrics, BaseMetric, OUTCOMES
+from comparisons import comparisons_from_file, Comparison, ComparisonSet,\
+    ComparisonStatistics
+from footprint import shard_size as _budget_shard_size
+
+
+# caches shared by all jobs run in the same process;
+# with worker processes that are forked, they are inherited from the parent
+_trees = {}
+_base_metrics = {}
+_comparisons = {}
+_unpacked = {}
+
+
+#################
+#  Job Manifest #
+#################
+
+def _job_from_line(job_line: str, inputfile: str='') -> dict:
+    """
+    Construct job specification from line in *.jobs file.
+
+    The lines of a *.jobs file are of the form
+    compare file; metrics file; ranks; tree directory; output file
+
+    compare file: path to *.compare file
+    metrics file: path to *.metrics file
+    ranks: number of ranks of RankedMetrics (default: 1)
+    tree directory: directory of trees referenced in the *.compare file
+    output file: file to which results are written; the format is
+                 determined by the extension (.csv, .npz, or streamed org
+                 table otherwise); by default,
+                 <folder>_<compare>_<metrics>_<ranks>.org, where folder is
+                 the folder of the *.compare file
+
+    Parameters
+    ----------
+    job_line: str
+        line from *.jobs file that is to be processed
+    inputfile: str
+        path to *.jobs file
+    """
+    parameters = [field.strip() for field in job_line.split(';')]
+    parameters += [''] * (5 - len(parameters))
+    compare, metrics, ranks, directory, output = parameters[:5]
+    if not compare or not metrics:
+        message = 'Error in file {0}:\n\
+not enough parameters specified'
+        raise Exception(message.format(inputfile))
+
+    ranks = int(ranks) if ranks else 1
+    if not output:
+        # include the folder, lest e.g. rc_prom/SRC-ORC and rc_wh/SRC-ORC
+        # write to the same file
+        folder = os.path.basename(os.path.dirname(os.path.normpath(compare)))
+        name = os.path.basename(compare).replace('.compare', '')
+        output = '{0}_{1}_{2}.org'.format(
+            '{0}_{1}'.format(folder, name) if folder else name,
+            os.path.basename(metrics).replace('.metrics', ''),
+            ranks)
+
+    return {'compare': compare, 'metrics': metrics, 'ranks': ranks,
+            'directory': directory or None, 'output': output}
+
+
+def jobs_from_file(inputfile: str, extension: str='.jobs') -> list:
+    """
+    Read list of job specifications from *.jobs file.
+
+    See _job_from_line for the format of the file.
+
+    Parameters
+    ----------
+    inputfile: str
+        path to *.jobs file (extension can be omitted)
+    extension: str
+        file extension for *.jobs files
+    """
+    if inputfile.endswith(extension):
+        inputfile = inputfile.replace(extension, '')
+
+    with open(inputfile + extension, 'r') as jobfile:
+        jobs = [_job_from_line(line, inputfile)
+                for line in jobfile.readlines()
+                # discard empty lines and comments
+                if not re.match(r'^\s*(#.*)?$', line)]
+        jobfile.close()
+    _check_outputs(jobs, inputfile=inputfile + extension)
+    return jobs
+
+
+def _check_outputs(jobs: list, output_dir: str=None, inputfile: str=''):
+    """Raise an exception if two jobs write to the same output file"""
+    outputs = {}
+    for job in jobs:
+        output = job['output']
+        if output_dir:
+            output = os.path.join(output_dir, output)
+        output = os.path.abspath(output)
+        if output in outputs:
+            message = 'Error in file {0}:\n\
+jobs for {1} and {2} both write to {3}'
+            raise Exception(message.format(inputfile or 'job list',
+                                           outputs[output], job['compare'],
+                                           output))
+        outputs[output] = job['compare']
+
+
+##################
+#  Running Jobs  #
+##################
+
+def _shared_base_metrics(inputfile: str) -> list:
+    """Read BaseMetrics from file, reusing metrics that were read before"""
+    key = os.path.abspath(inputfile)
+    if key not in _base_metrics:
+        _base_metrics[key] = base_metrics_from_file(inputfile)
+    return _base_metrics[key]
+
+
+def _prepare(jobs: list):
+    """Read all metrics and build all trees used by jobs"""
+    for job in jobs:
+        _shared_base_metrics(job['metrics'])
+        # the comparisons are discarded, we only want the trees
+        comparisons_from_file(job['compare'], directory=job['directory'],
+                              trees=_trees)
+
+
+def run_job(job: dict, output_dir: str=None) -> dict:
+    """
+    Run a single job and write its results to file.
+
+    Parameters
+    ----------
+    job: dict
+        job specification (see _job_from_line)
+    output_dir: str
+        directory for output files; relative output paths are
+        interpreted relative to it
+
+    Returns
+    -------
+    dict
+        the job specification with the number of successful,
+        tie-ing, and failing metrics
+    """
+    metrics = _construct_ranked_metric(
+        metric_set=_shared_base_metrics(job['metrics']),
+        ranks=job['ranks'],
+        compact=True)
+    comp = comparisons_from_file(job['compare'], directory=job['directory'],
+                                 metrics=metrics, trees=_trees)
+
+    output = job['output']
+    if output_dir:
+        output = os.path.join(output_dir, output)
+    if output.endswith('.csv') or output.endswith('.npz'):
+        comp.export(output)
+    else:
+        comp.table(filename=output, stream=True)
+
+    summary = dict(job)
+    summary.update({'output': output,
+                    'success': len(comp.success),
+                    'tie': len(comp.tie),
+                    'failure': len(comp.failure)})
+    return summary
+
+
+def run_jobs(jobs: 'list or str', workers: int=None,
+             executor: str='process', output_dir: str=None) -> list:
+    """
+    Run batch of jobs concurrently.
+
+    Before any job is started, all metrics and trees are built once in the
+    current process, so that the jobs can share them. Worker processes
+    inherit these from the parent process on platforms that fork, and build
+    them at most once per worker otherwise.
+
+    Parameters
+    ----------
+    jobs: list or str
+        list of job specifications, or path to a *.jobs file
+    workers: int
+        number of workers; by default, one per CPU; with workers=1, all
+        jobs are run sequentially in the current process
+    executor: str
+        process or thread
+    output_dir: str
+        directory for output files
+
+    Returns
+    -------
+    list
+        summaries of all jobs (see run_job), in the order of jobs
+
+    Examples
+    --------
+    >>> run_jobs('./jobs/rc', workers=4, output_dir='./results')
+    """
+    if isinstance(jobs, str):
+        jobs = jobs_from_file(jobs)
+    _check_outputs(jobs, output_dir)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    _prepare(jobs)
+
+    if workers == 1:
+        return [run_job(job, output_dir) for job in jobs]
+
+    if executor == 'process':
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    elif executor == 'thread':
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise Exception('Unknown executor {0}'.format(executor))
+
+    with pool:
+        futures = [pool.submit(run_job, job, output_dir) for job in jobs]
+        return [future.result() for future in futures]
+
+
+###########################
+#  Distributed Evaluation #
+###########################
+
+def _shared_comparisons(compare: str, directory: str=None) -> 'ComparisonSet':
+    """Read comparisons from file, reusing comparisons that were read before"""
+    key = (os.path.abspath(compare), directory)
+    if key not in _comparisons:
+        _comparisons[key] = comparisons_from_file(compare,
+                                                  directory=directory,
+                                                  trees=_trees)
+    return _comparisons[key]
+
+
+def evaluate_packed(compare: str, directory: str,
+                    table: tuple, ranks: int, ids: 'array') -> 'array':
+    """
+    Compute outcome codes of packed RankedMetrics.
+
+    This is the function run by the workers of evaluate_metrics. The
+    comparisons and the BaseMetrics of table are only built once per
+    process, no matter how many batches of ids the process evaluates.
+
+    Parameters
+    ----------
+    compare: str
+        path to *.compare file
+    directory: str
+        directory of the trees referenced in the *.compare file
+    table, ranks, ids:
+        packed RankedMetrics (see metrics.pack_metrics)
+
+    Returns
+    -------
+    array
+        outcome codes (SUCCESS, TIE, FAILURE) for each RankedMetric and
+        each comparison, in row-major order
+    """
+    comp = _shared_comparisons(compare, directory)
+    if table not in _unpacked:
+        _unpacked[table] = [BaseMetric.from_spec(spec) for spec in table]
+
+    outcomes = array.array('b')
+    for metric in unpack_metrics(table, ranks, ids,
+                                 base_metrics=_unpacked[table]):
+        for comparison in comp.comparisons:
+            metric.compare(comparison.name,
+                           comparison.winner, comparison.loser)
+            outcomes.append(metric.outcome(comparison.name))
+    return outcomes
+
+
+def evaluate_metrics(compare: str, metrics: list, directory: str=None,
+                     workers: int=None, chunk_size: int=10000) -> 'array':
+    """
+    Compute outcome codes of RankedMetrics on a pool of worker processes.
+
+    The RankedMetrics are packed into a table of BaseMetric specs and an
+    array of ids, which is split into chunks of chunk_size RankedMetrics.
+    Only the table and the id chunks are sent to the workers.
+
+    Parameters
+    ----------
+    compare: str
+        path to *.compare file
+    metrics: list
+        RankedMetrics, all of the same rank
+    directory: str
+        directory of the trees referenced in the *.compare file
+    workers: int
+        number of worker processes; by default, one per CPU; with
+        workers=1, everything is computed in the current process
+    chunk_size: int
+        number of RankedMetrics per task
+
+    Returns
+    -------
+    array
+        outcome codes for each RankedMetric and each comparison, in
+        row-major order, i.e. the code of the n-th metric for the c-th
+        comparison is at position n * len(comparisons) + c
+
+    Examples
+    --------
+    >>> metrics = metrics_from_file('./metrics/base', ranks=2)
+    >>> outcomes = evaluate_metrics('./comparisons/rc', metrics, workers=4)
+    """
+    table, ranks, ids = pack_metrics(metrics)
+    # build trees before any worker is forked
+    _shared_comparisons(compare, directory)
+
+    step = chunk_size * ranks
+    chunks = [ids[start:start + step] for start in range(0, len(ids), step)]
+
+    outcomes = array.array('b')
+    if workers == 1:
+        for chunk in chunks:
+            outcomes.extend(evaluate_packed(compare, directory,
+                                            table, ranks, chunk))
+        return outcomes
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_packed, compare, directory,
+                               table, ranks, chunk)
+                   for chunk in chunks]
+        for future in futures:
+            outcomes.extend(future.result())
+    return outcomes
+
+
+#######################
+#  Sharded Evaluation #
+#######################
+
+def shard_ranges(total: int, shard_size: int) -> list:
+    """
+    Split the numbers 0 to total - 1 into ranges of shard_size numbers.
+
+    Examples
+    --------
+    >>> shard_ranges(10, 4)
+    [(0, 4), (4, 8), (8, 10)]
+    """
+    return [(start, min(start + shard_size, total))
+            for start in range(0, total, shard_size)]
+
+
+def evaluate_shard(compare: str, directory: str, table: tuple,
+                   ranks: int, start: int, stop: int) -> 'array':
+    """
+    Compute outcome codes of a shard of RankedMetrics.
+
+    This is the function run by the workers of evaluate_sharded. The
+    RankedMetrics with numbers in [start, stop) are built from the
+    BaseMetric specs in table (see ranked_metrics), one at a time.
+
+    Returns
+    -------
+    array
+        outcome codes for each RankedMetric and each comparison, in
+        row-major order (see evaluate_metrics)
+    """
+    comp = _shared_comparisons(compare, directory)
+    if table not in _unpacked:
+        _unpacked[table] = [BaseMetric.from_spec(spec) for spec in table]
+
+    outcomes = array.array('b')
+    for metric in ranked_metrics(_unpacked[table], ranks=ranks,
+                                 start=start, stop=stop, compact=True):
+        for comparison in comp.comparisons:
+            metric.compare(comparison.name,
+                           comparison.winner, comparison.loser)
+            outcomes.append(metric.outcome(comparison.name))
+    return outcomes
+
+
+def _shard_metrics(comp: 'ComparisonSet', base_metrics: list, ranks: int,
+                   start: int, stop: int, outcomes: 'array',
+                   results: list=None) -> list:
+    """
+    Rebuild the RankedMetrics of a shard with their outcome codes.
+
+    If results is specified, the metrics are also sorted into its
+    success, tie, and failure sets, one dictionary per Comparison.
+    """
+    metrics = list(ranked_metrics(base_metrics, ranks=ranks,
+                                  start=start, stop=stop, compact=True))
+    subtypes = {(True, True): 'success', (False, True): 'tie',
+                (False, False): 'failure'}
+
+    position = 0
+    for metric in metrics:
+        for number, comparison in enumerate(comp.comparisons):
+            code = outcomes[position]
+            position += 1
+            metric._contrasts[comparison.name] = (comparison.winner,
+                                                  comparison.loser)
+            metric._outcomes[comparison.name] = code
+            metric.viable = metric._pair_and(metric.viable, OUTCOMES[code])
+            # like Comparison.compare, sort by viability so far
+            if results is not None:
+                results[number][subtypes[metric.viable]].add(metric)
+    return metrics
+
+
+def evaluate_sharded(compare: str, metrics: 'str or list', ranks: int=1,
+                     directory: str=None, budget: int=None,
+                     shard_size: int=None, workers: int=1,
+                     aggregate: bool=False,
+                     top: int=10) -> 'ComparisonSet or ComparisonStatistics':
+    """
+    Compare all RankedMetrics of rank ranks in shards.
+
+    The RankedMetrics are numbered in the order of _construct_ranked_metric
+    and split into shards of consecutive numbers, so the shards only depend
+    on the BaseMetrics, ranks, and the shard size. Each shard is evaluated
+    on its own, sequentially or on a pool of worker processes, and the
+    results are collected into a single ComparisonSet of compact
+    RankedMetrics, which is the same as the one built by
+    comparisons_from_file.
+
+    Parameters
+    ----------
+    compare: str
+        path to *.compare file
+    metrics: str or list
+        path to *.metrics file, or list of BaseMetrics
+    ranks: int
+        number of BaseMetrics per RankedMetric
+    directory: str
+        directory of the trees referenced in the *.compare file
+    budget: int
+        memory in bytes that the shards evaluated at the same time may
+        take up; used to compute the shard size (see footprint.shard_size)
+    shard_size: int
+        number of RankedMetrics per shard; overrides budget;
+        defaults to 10000 if neither is specified
+    workers: int
+        number of worker processes; with workers=None, one per CPU;
+        with workers=1, all shards are evaluated in the current process
+    aggregate: bool
+        return ComparisonStatistics instead of a ComparisonSet, so that the
+        RankedMetrics of a shard can be discarded once it has been counted
+    top: int
+        number of best metrics kept by the ComparisonStatistics
+
+    Examples
+    --------
+    >>> comp = evaluate_sharded('./comparisons/rc_prom/AllSingleRCs',
+    >>>                         './metrics/filtered', ranks=3,
+    >>>                         directory='./trees/rc_prom',
+    >>>                         budget=512 * 2**20, workers=4)
+    >>> comp.show()
+    """
+    if isinstance(metrics, str):
+        base_metrics = _shared_base_metrics(metrics)
+    else:
+        base_metrics = list(metrics)
+    table = tuple(metric.spec() for metric in base_metrics)
+    # build trees before any worker is forked
+    comp = _shared_comparisons(compare, directory)
+
+    total = len(base_metrics) ** ranks if ranks else 0
+    if not shard_size:
+        if budget:
+            parallel = workers or os.cpu_count() or 1
+            shard_size = _budget_shard_size(len(base_metrics), ranks,
+                                            len(comp.comparisons),
+                                            budget // parallel,
+                                            compact=True)
+        else:
+            shard_size = 10000
+    shards = shard_ranges(total, shard_size)
+
+    if workers == 1:
+        results = (evaluate_shard(compare, directory, table, ranks,
+                                  start, stop)
+                   for start, stop in shards)
+        return _merge_shards(comp, base_metrics, ranks, shards, results,
+                             aggregate, top)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_shard, compare, directory,
+                               table, ranks, start, stop)
+                   for start, stop in shards]
+        results = (future.result() for future in futures)
+        return _merge_shards(comp, base_metrics, ranks, shards, results,
+                             aggregate, top)
+
+
+def _merge_shards(comp: 'ComparisonSet', base_metrics: list, ranks: int,
+                  shards: list, results: 'iterable', aggregate: bool,
+                  top: int) -> 'ComparisonSet or ComparisonStatistics':
+    """
+    Merge the outcome codes of all shards, in order.
+
+    The metrics and results of all shards are collected first, and the
+    ComparisonSet is built and tallied once at the end, so the cost is
+    linear in the number of metrics no matter how many shards there are.
+    """
+    if aggregate:
+        stats = ComparisonStatistics([comparison.name
+                                      for comparison in comp.comparisons],
+                                     top=top)
+        for (start, stop), outcomes in zip(shards, results):
+            for metric in _shard_metrics(comp, base_metrics, ranks,
+                                         start, stop, outcomes):
+                stats.add(metric)
+        return stats
+
+    metrics = []
+    groups = [{'success': set(), 'tie': set(), 'failure': set()}
+              for _ in comp.comparisons]
+    for (start, stop), outcomes in zip(shards, results):
+        metrics.extend(_shard_metrics(comp, base_metrics, ranks,
+                                      start, stop, outcomes, groups))
+
+    merged = ComparisonSet([], name=comp.name, metrics=metrics)
+    for comparison, group in zip(comp.comparisons, groups):
+        merged.add(Comparison(name=comparison.name,
+                              winner=comparison.winner,
+                              loser=comparison.loser,
+                              metrics=metrics, **group))
+    merged._tally()
+    return merged
@@ -16,12 +16,26 @@
 #
 # - Functions for building metrics from text files
 
+import array
+import collections.abc
 import itertools
-import os
 import re
 
 from io_tree import IOTree
-from tree_values import memory_measure, safemax, safediv, avg
+from tree_values import memory_measure
+from plugins import resolve, name_of
+
+
+###################
+#  Outcome Codes  #
+###################
+
+# compact codes for the result of a comparison;
+# they are ordered so that the meet of two outcomes (see
+# RankedMetric._pair_and) is simply their minimum
+FAILURE, TIE, SUCCESS = 0, 1, 2
+OUTCOMES = ((False, False), (False, True), (True, True))
+CODES = {viability: code for code, viability in enumerate(OUTCOMES)}
 
 
 ##################
@@ -54,6 +68,9 @@ class BaseMetric:
         name of metric
     .eval: IOTree -> val
         compute metric value for IOTree
+    .spec: tuple
+        picklable description of metric from which it can be rebuilt
+        with BaseMetric.from_spec (e.g. in a worker process)
     """
     def __init__(self, name: str='',
                  load_type: str='tenure', operator: 'function'=None,
@@ -75,6 +92,33 @@ class BaseMetric:
                              filters=self.filters,
                              trivial=self.trivial)
 
+    def spec(self) -> tuple:
+        """
+        Describe metric by a tuple of strings, bools, and tuples.
+
+        Operator and function are replaced by the names under which they
+        are registered (see plugins.resolve), so the tuple can be pickled
+        cheaply, unlike the functions themselves.
+        """
+        operator_id = name_of(self.operator, 'operator')
+        function_id = name_of(self.function, 'function')
+        if (self.operator and not operator_id) or not function_id:
+            message = 'Metric {0} uses an unregistered operator or function'
+            raise Exception(message.format(self.name))
+        return (self.name, self.load_type, operator_id,
+                self.trivial, tuple(self.filters), self.latex, function_id)
+
+    @classmethod
+    def from_spec(cls, spec: tuple) -> 'BaseMetric':
+        """Rebuild metric from the output of .spec"""
+        name, load_type, operator_id, trivial, filters, latex, function_id =\
+            spec
+        return cls(name=name, load_type=load_type,
+                   operator=resolve(operator_id, 'operator')
+                   if operator_id else None,
+                   trivial=trivial, filters=filters, latex=latex,
+                   function=resolve(function_id, 'function'))
+
 
 class RankedMetric():
     """
@@ -112,14 +156,45 @@ class RankedMetric():
         compute value for MetricTree (if it doesn't exist yet) and return it
     .compare: IOTree, IOTree -> updated metric
         compares two IOTrees and updates the metric accordingly
+    .outcome: str -> int
+        outcome code (SUCCESS, TIE, FAILURE) for the named contrast
+    .captured: str -> (bool, bool)
+        viability of the metric for the named contrast
+    .variant: tuple -> RankedMetric
+        RankedMetric over equivalent BaseMetrics that shares self's results
+    .merge: RankedMetric -> updated metric
+        copy results of another RankedMetric for contrasts not tested yet
+
+    Compact Storage
+    ---------------
+    With compact=True, a RankedMetric does not store a dictionary per
+    contrast. Instead, it only keeps an outcome code per contrast, while the
+    trees of each contrast are stored once in the dictionary contrasts, which
+    is shared by all RankedMetrics built from the same set of BaseMetrics.
+    Values are looked up in the value table of each MetricTree (see
+    MetricTree.base_value). The attribute .profile is then a read-only view
+    that rebuilds the usual contrast dictionaries on demand.
     """
-    def __init__(self, metrics: tuple):
+    def __init__(self, metrics: tuple,
+                 compact: bool=False, contrasts: dict=None):
         self.metrics = metrics
-        self.profile = {}
+        self.compact = compact
+        if compact:
+            self._outcomes = {}
+            self._contrasts = contrasts if contrasts is not None else {}
+        else:
+            self._profile = {}
         self.viable = (True, True)
         self.name = self._name()
         self.filters = self._filters()
 
+    @property
+    def profile(self):
+        if self.compact:
+            return ProfileView(self)
+        else:
+            return self._profile
+
     def _name(self):
         """Typest name as ranked version of BaseMetric names"""
         return ' > '.join([metric.name for metric in self.metrics])
@@ -143,12 +218,20 @@ class RankedMetric():
         """Retrieve or compute value of MetricTree with respect to metric"""
         assert(isinstance(tree, MetricTree))
 
-        value = tree.profile.get(self.name, None)
-        if not value:
-            value = self.eval(tree)
-            tree.add_metric(self, value)
+        entry = tree.profile.get(self, None)
+        if entry:
+            return entry['value']
+        value = self.value(tree)
+        tree.add_metric(self, value)
         return value
 
+    def value(self, tree: 'IOTree'):
+        """Compute value of tree, reusing the value table of MetricTrees"""
+        if isinstance(tree, MetricTree):
+            return [tree.base_value(metric) for metric in self.metrics]
+        else:
+            return self.eval(tree)
+
     def _captures(self, value1: int, value2: int) -> (bool, bool):
         """Determine viability of metric based on computed values"""
         if value1 < value2:
@@ -168,20 +251,120 @@ class RankedMetric():
         """
         return (pair1[0] and pair2[0], pair1[1] and pair2[1])
 
-    def compare(self, name: str, tree1: 'IOTree', tree2: 'IOTree'):
-        """Compare two IOTrees with respect to ranked metric"""
+    def compare(self, name: str, tree1: 'IOTree', tree2: 'IOTree',
+                cache: bool=True):
+        """
+        Compare two IOTrees with respect to ranked metric.
 
-        tree1_value = self.get_or_set_value(tree1)
-        tree2_value = self.get_or_set_value(tree2)
+        If cache is False, the values are not stored in the profiles of the
+        trees, so that the trees do not keep a reference to the metric.
+        """
+        if self.compact:
+            # compact metrics only use the value tables of the trees
+            self._contrasts[name] = (tree1, tree2)
+            viable = self._captures(self.value(tree1), self.value(tree2))
+            self._outcomes[name] = CODES[viable]
+            self.viable = self._pair_and(self.viable, viable)
+            return
+
+        if cache:
+            tree1_value = self.get_or_set_value(tree1)
+            tree2_value = self.get_or_set_value(tree2)
+        else:
+            tree1_value = self.value(tree1)
+            tree2_value = self.value(tree2)
         viable = self._captures(tree1_value, tree2_value)
 
         contrast = {'name': name,
                     'desired winner': (tree1, tree1.name, tree1_value),
                     'desired loser': (tree2, tree2.name, tree2_value),
                     'captured': viable}
-        self.profile[name] = contrast
+        self._profile[name] = contrast
         self.viable = self._pair_and(self.viable, viable)
 
+    def variant(self, metrics: tuple) -> 'RankedMetric':
+        """
+        Build RankedMetric from metrics that shares results with self.
+
+        This is only sound if each member of metrics is equivalent to the
+        corresponding member of self.metrics (see equivalence_classes).
+        """
+        variant = RankedMetric(metrics, compact=self.compact)
+        if self.compact:
+            variant._outcomes = self._outcomes
+            variant._contrasts = self._contrasts
+        else:
+            variant._profile = self._profile
+        variant.viable = self.viable
+        return variant
+
+    def merge(self, metric: 'RankedMetric'):
+        """
+        Adopt the results of metric for contrasts self has not been tested on.
+
+        metric should be built from the same BaseMetrics as self (e.g. in
+        another ComparisonSet); its results are copied, not recomputed.
+        """
+        for name in metric.profile:
+            if name in self.profile:
+                continue
+            if self.compact and metric.compact:
+                self._contrasts[name] = metric._contrasts[name]
+                self._outcomes[name] = metric._outcomes[name]
+            elif self.compact:
+                contrast = metric._profile[name]
+                self._contrasts[name] = (contrast['desired winner'][0],
+                                         contrast['desired loser'][0])
+                self._outcomes[name] = CODES[contrast['captured']]
+            else:
+                self._profile[name] = metric.profile[name]
+            self.viable = self._pair_and(self.viable, metric.captured(name))
+
+    def outcome(self, name: str) -> int:
+        """Return outcome code of metric for contrast"""
+        if self.compact:
+            return self._outcomes[name]
+        else:
+            return CODES[self._profile[name]['captured']]
+
+    def captured(self, name: str) -> (bool, bool):
+        """Return viability of metric for contrast"""
+        if self.compact:
+            return OUTCOMES[self._outcomes[name]]
+        else:
+            return self._profile[name]['captured']
+
+
+class ProfileView(collections.abc.Mapping):
+    """
+    Read-only view of the profile of a compact RankedMetric.
+
+    Each contrast is rebuilt from the metric's outcome code, the shared
+    contrast dictionary, and the value tables of the trees, so that it has
+    the same format as the profile of a non-compact RankedMetric.
+    """
+    def __init__(self, metric: 'RankedMetric'):
+        self.metric = metric
+
+    def __getitem__(self, name: str) -> dict:
+        code = self.metric._outcomes[name]
+        tree1, tree2 = self.metric._contrasts[name]
+        return {'name': name,
+                'desired winner': (tree1, tree1.name,
+                                   self.metric.value(tree1)),
+                'desired loser': (tree2, tree2.name,
+                                  self.metric.value(tree2)),
+                'captured': OUTCOMES[code]}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.metric._outcomes
+
+    def __iter__(self):
+        return iter(self.metric._outcomes)
+
+    def __len__(self):
+        return len(self.metric._outcomes)
+
 
 
 class MetricTree(IOTree):
@@ -199,10 +382,24 @@ class MetricTree(IOTree):
     .add_metric: metric, value -> updated MetricTree
         attach metric to tree by adding it to .profile;
         if value is not specified, it will be computed
+    .values: dict
+        value table that maps each BaseMetric to the tree's value
+    .base_value: BaseMetric -> val
+        look up value of BaseMetric in .values, computing it if necessary
     """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.profile = {}
+        self.values = {}
+
+    def base_value(self, metric: 'BaseMetric'):
+        """Retrieve or compute value of self under BaseMetric"""
+        try:
+            return self.values[metric]
+        except KeyError:
+            value = metric.eval(self)
+            self.values[metric] = value
+            return value
 
     def add_metric(self, metric, value: int=None):
         """Store self's value under metric in profile"""
@@ -215,7 +412,8 @@ class MetricTree(IOTree):
 #####################################
 
 
-def _construct_ranked_metric(metric_set: list=[], ranks: int=2) -> list:
+def _construct_ranked_metric(metric_set: list=[], ranks: int=2,
+                             compact: bool=False) -> list:
     """
     Construct RankedMetrics from BaseMetrics.
 
@@ -230,14 +428,199 @@ def _construct_ranked_metric(metric_set: list=[], ranks: int=2) -> list:
         list of BaseMetric objects
     ranks: int
         maximum number of BaseMetric objects a RankedMetric may consist of
+    compact: bool
+        build compact RankedMetrics that share a single contrast dictionary
     """
     if ranks == 0:
         return []
     else:
-        return [RankedMetric(metric_tuple)
+        contrasts = {} if compact else None
+        return [RankedMetric(metric_tuple,
+                             compact=compact, contrasts=contrasts)
                 for metric_tuple in
                 itertools.product(*[metric_set for _ in range(ranks)])]
 
+def ranked_metrics(metric_set: list=[], ranks: int=2,
+                   start: int=0, stop: int=None,
+                   compact: bool=False) -> 'iterable':
+    """
+    Lazily construct a range of the RankedMetrics of _construct_ranked_metric.
+
+    The RankedMetrics in metric_set^ranks are numbered in the order of
+    _construct_ranked_metric (i.e. itertools.product), and only those with
+    numbers in [start, stop) are generated. Since the numbering only depends
+    on metric_set and ranks, ranges can be used as reproducible shards of the
+    full set of RankedMetrics.
+
+    Parameters
+    ----------
+    metric_set: list
+        list of BaseMetric objects
+    ranks: int
+        number of BaseMetric objects per RankedMetric
+    start: int
+        number of first RankedMetric to be generated
+    stop: int
+        number of first RankedMetric not to be generated;
+        defaults to len(metric_set)**ranks
+    compact: bool
+        build compact RankedMetrics that share a single contrast dictionary
+
+    Examples
+    --------
+    >>> shard = list(ranked_metrics(base_metrics, ranks=3,
+    >>>                             start=1000, stop=2000))
+    """
+    total = len(metric_set) ** ranks if ranks else 0
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return
+
+    # decode start as number in base len(metric_set), last rank fastest
+    digits = []
+    index = start
+    for _ in range(ranks):
+        index, digit = divmod(index, len(metric_set))
+        digits.append(digit)
+    digits.reverse()
+
+    contrasts = {} if compact else None
+    for _ in range(stop - start):
+        yield RankedMetric(tuple(metric_set[digit] for digit in digits),
+                           compact=compact, contrasts=contrasts)
+        # increment digits like an odometer
+        for pos in reversed(range(ranks)):
+            digits[pos] += 1
+            if digits[pos] < len(metric_set):
+                break
+            digits[pos] = 0
+
+
+def pack_metrics(metrics: list) -> (tuple, int, 'array'):
+    """
+    Encode RankedMetrics as a table of BaseMetric specs and an id array.
+
+    Every distinct BaseMetric is stored only once, as its spec (see
+    BaseMetric.spec), and each RankedMetric is reduced to the positions of
+    its BaseMetrics in that table. The result can be sent to worker processes
+    far more cheaply than the RankedMetrics themselves, which may hold
+    references to trees in their profiles.
+
+    Parameters
+    ----------
+    metrics: list
+        RankedMetrics, all of the same rank
+
+    Returns
+    -------
+    tuple
+        the table, i.e. a tuple of BaseMetric specs
+    int
+        the rank of the RankedMetrics
+    array
+        flat array of table positions; the n-th RankedMetric is given by
+        ids[n*ranks:(n+1)*ranks]
+
+    Examples
+    --------
+    >>> table, ranks, ids = pack_metrics(metrics_from_file('./metrics/base',
+    >>>                                                    ranks=2))
+    >>> metrics = list(unpack_metrics(table, ranks, ids))
+    """
+    ranks = len(metrics[0].metrics) if metrics else 0
+    positions = {}
+    table = []
+    ids = array.array('I')
+    for metric in metrics:
+        if len(metric.metrics) != ranks:
+            raise Exception('Cannot pack RankedMetrics of different ranks')
+        for base_metric in metric.metrics:
+            if base_metric not in positions:
+                positions[base_metric] = len(table)
+                table.append(base_metric.spec())
+            ids.append(positions[base_metric])
+    return tuple(table), ranks, ids
+
+
+def unpack_metrics(table: tuple, ranks: int, ids: 'array',
+                   base_metrics: list=None,
+                   compact: bool=True) -> 'iterable':
+    """
+    Rebuild RankedMetrics from the output of pack_metrics.
+
+    Parameters
+    ----------
+    table: tuple
+        BaseMetric specs
+    ranks: int
+        rank of the RankedMetrics
+    ids: array
+        flat array of table positions
+    base_metrics: list
+        BaseMetrics already built from table; pass them in when unpacking
+        several id arrays with the same table so that the values of
+        MetricTrees are only computed once per BaseMetric
+    compact: bool
+        build compact RankedMetrics that share a single contrast dictionary
+    """
+    if not ranks:
+        return
+    if base_metrics is None:
+        base_metrics = [BaseMetric.from_spec(spec) for spec in table]
+    contrasts = {} if compact else None
+    for start in range(0, len(ids), ranks):
+        yield RankedMetric(tuple(base_metrics[position]
+                                 for position in ids[start:start + ranks]),
+                           compact=compact, contrasts=contrasts)
+
+
+def _hashable(value):
+    """Convert (nested) list values to tuples so that they can be hashed"""
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def equivalence_classes(metric_set: list, trees: list) -> dict:
+    """
+    Group BaseMetrics that assign identical values to every tree.
+
+    Whether a RankedMetric captures a contrast depends only on the values
+    its components assign to the trees of the contrast. So if two BaseMetrics
+    assign the same values to all trees, any RankedMetric built from one of
+    them behaves exactly like the RankedMetric built from the other. It
+    suffices to build RankedMetrics from one representative of each class.
+
+    Parameters
+    ----------
+    metric_set: list
+        list of BaseMetric objects
+    trees: list
+        trees over which value vectors are computed; values of MetricTrees
+        are stored in their value tables
+
+    Returns
+    -------
+    dict
+        maps the first member of each class (its representative)
+        to the list of all members, in the order of metric_set
+
+    Examples
+    --------
+    >>> classes = equivalence_classes(base_metrics, comp.trees())
+    >>> len(base_metrics), len(classes)
+    (90, 37)
+    """
+    by_vector = {}
+    for metric in metric_set:
+        vector = tuple(_hashable(tree.base_value(metric)
+                                 if isinstance(tree, MetricTree)
+                                 else metric.eval(tree))
+                       for tree in trees)
+        by_vector.setdefault(vector, []).append(metric)
+    return {members[0]: members for members in by_vector.values()}
+
+
 def _powerset(iterable):
     """powerset([1,2,3]) --> () (1,) (2,) (3,) (1,2) (1,3) (2,3) (1,2,3)"""
     s = list(iterable)
@@ -310,7 +693,7 @@ def _construct_metrics_from_text(metric_text: list=[]):
     # actual Python function to be called
     for key in ['function', 'operator']:
         if metric_dict[key]:
-            metric_dict[key] = eval(metric_dict[key])
+            metric_dict[key] = resolve(metric_dict[key], kind=key)
 
     # also construct filters correctly
     metrics = []
@@ -325,7 +708,8 @@ def _construct_metrics_from_text(metric_text: list=[]):
 
 def metrics_from_file(inputfile: str=None,
                       extension: str='.metrics',
-                      ranks: int=1):
+                      ranks: int=1,
+                      compact: bool=False):
     """
     Batch construct metrics from text file.
 
@@ -341,6 +725,8 @@ def metrics_from_file(inputfile: str=None,
         file extension for *.metrics files
     ranks: int
         build complex metrics that contain up to int base metrics
+    compact: bool
+        store comparison results as outcome codes (see RankedMetric)
 
     Examples
     --------
@@ -349,6 +735,35 @@ def metrics_from_file(inputfile: str=None,
     >>> test_metrics = metrics_from_file('./metrics/base.foo',
     >>> extension='.foo', ranks=2)
     """
+    # use base_metrics_from_file to build a base set of metrics,
+    # and expand that into the full set with construct_ranked_metric
+    return _construct_ranked_metric(
+        ranks=ranks,
+        compact=compact,
+        metric_set=base_metrics_from_file(inputfile=inputfile,
+                                          extension=extension))
+
+
+def base_metrics_from_file(inputfile: str=None,
+                           extension: str='.metrics') -> list:
+    """
+    Construct list of BaseMetrics from text file.
+
+    This is the first step of metrics_from_file, which then builds
+    RankedMetrics from the BaseMetrics.
+
+    Parameters
+    ----------
+    inputfile: str
+        path to *.metrics file (extension can be omitted);
+        if none is specified, we explicitly ask the user
+    extension: str
+        file extension for *.metrics files
+
+    Examples
+    --------
+    >>> base_metrics = base_metrics_from_file('./metrics/filtered')
+    """
     # ask for input file if necessary
     if not inputfile:
         inputfile =\
@@ -356,7 +771,6 @@ def metrics_from_file(inputfile: str=None,
 
     if inputfile.endswith(extension):
         inputfile = inputfile.replace(extension, '')
-    basename = os.path.basename(inputfile)
 
     # read in specification file
     with open(inputfile + extension, 'r') as metricfile:
@@ -366,10 +780,7 @@ def metrics_from_file(inputfile: str=None,
                    if not re.match(r'^\s*(#.*)?$', line)]
         metricfile.close()
 
-    # use _construct_metrics_from_text to build a base set of metrics,
-    # and expand that into the full set with construct_ranked_metric
-    return _construct_ranked_metric(
-        ranks=ranks,
-        metric_set=[metric_variant
-                    for metric in metrics
-                    for metric_variant in _construct_metrics_from_text(metric)])
+    # use _construct_metrics_from_text to build a base set of metrics
+    return [metric_variant
+            for metric in metrics
+            for metric_variant in _construct_metrics_from_text(metric)]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This file is called by metrics.py
+#
+# It is the registry of all named operators and measure functions that
+# can be used in *.metrics files. Names are resolved without eval:
+#
+# 1. the built-in operators (safemax, sum, len, avg, sorted, ...)
+#    and functions (memory_measure) of mgproc
+# 2. functions registered explicitly with @register
+# 3. functions defined in the Python files in the folder usercode;
+#    these files are only executed when a name cannot be found anywhere
+#    else, so importing mgproc never runs any user code
+#
+# Python's built-in functions are deliberately not looked up, lest a
+# *.metrics file name eval, exec, open, or __import__; the few that make
+# sense as operators are listed explicitly.
+#
+# Resolved names are cached, and every function can be mapped back to its
+# name, so that metrics can be described by picklable specifications
+# (see BaseMetric.spec).
+#
+# The usercode folder is located relative to this file, not to the
+# current working directory.
+
+import os
+
+from tree_values import memory_measure, safemax, avg, reverse_sorted
+
+
+_user_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'usercode')
+
+# built-in operators and measure functions
+_builtin = {'operator': {'safemax': safemax,
+                         'avg': avg,
+                         'sum': sum,
+                         'len': len,
+                         'sorted': sorted,
+                         'reverse_sorted': reverse_sorted,
+                         'min': min,
+                         'max': max,
+                         'any': any,
+                         'all': all},
+            'function': {'memory_measure': memory_measure}}
+# explicitly registered functions
+_registry = {}
+# namespace of the code in usercode; None until the code has been loaded
+_namespace = None
+# caches for resolve and name_of
+_resolved = {}
+_names = {}
+
+
+def register(function: 'function'=None, name: str=None):
+    """
+    Register function under name (default: its __name__).
+
+    Can be used as a plain decorator or with a name argument.
+
+    Examples
+    --------
+    >>> @register
+    >>> def spread(int_list):
+    >>>     return safemax(int_list) - min(int_list, default=0)
+
+    >>> @register(name='Spread')
+    >>> def spread(int_list):
+    >>>     return safemax(int_list) - min(int_list, default=0)
+    """
+    def decorator(function):
+        _registry[name or function.__name__] = function
+        _resolved.clear()
+        _names[function] = name or function.__name__
+        return function
+
+    if function is None:
+        return decorator
+    return decorator(function)
+
+
+def load_user_code(user_file: str=None,
+                   user_dir: str=None) -> dict:
+    """
+    Load user-defined code.
+
+    The user may want to define new tree traversals or new functions to be used
+    by metrics. To simplify this, users can just add Python files to a user_dir
+    folder. The code is executed in a namespace that already contains all
+    public names of mgproc's modules, which is returned.
+
+    Parameters
+    ----------
+    user_file: str
+        specific file to be loaded; by default, all files are loaded
+    user_dir: str
+        folder from which .py files are to be loaded; defaults to the
+        folder usercode next to this file
+    """
+    global _namespace
+
+    if not user_dir:
+        user_dir = _user_dir
+
+    if user_file:
+        user_files = [os.path.join(user_dir, user_file)]
+    elif os.path.isdir(user_dir):
+        user_files = [os.path.join(user_dir, user_file)
+                      for user_file in sorted(os.listdir(user_dir))
+                      if user_file.endswith('py')]
+    else:
+        user_files = []
+
+    if _namespace is None:
+        _namespace = _base_namespace()
+
+    # execute code in each file and
+    # add it to the namespace of user code
+    for user_file in user_files:
+        with open(user_file, 'r') as code_file:
+            code = code_file.read()
+            code_file.close()
+            exec(compile(code, user_file, 'exec'), _namespace)
+    _resolved.clear()
+    return _namespace
+
+
+def _base_namespace() -> dict:
+    """Namespace with everything user code used to see via star imports"""
+    namespace = {'register': register}
+    for module in ['io_tree', 'tree_values', 'metrics', 'helpers']:
+        exec('from {0} import *'.format(module), namespace)
+    return namespace
+
+
+def user_namespace() -> dict:
+    """Return namespace of user code, loading the code on first use"""
+    if _namespace is None:
+        load_user_code()
+    return _namespace
+
+
+def user_function(name: str) -> 'function':
+    """
+    Look up user-defined function by name.
+
+    Explicitly registered functions take precedence; the code in usercode
+    is only loaded if the name has not been registered.
+    """
+    if name in _registry:
+        return _registry[name]
+    # private names of the namespace, e.g. __builtins__, are off limits
+    if not name.startswith('_'):
+        try:
+            return user_namespace()[name]
+        except KeyError:
+            pass
+    raise NameError("name '{0}' is not defined".format(name))
+
+
+def resolve(name: str, kind: str='operator') -> 'function':
+    """
+    Look up operator or measure function by name.
+
+    Parameters
+    ----------
+    name: str
+        name of operator or function as used in *.metrics files
+    kind: str
+        operator or function
+
+    Examples
+    --------
+    >>> resolve('safemax')
+    <function safemax at 0x7f...>
+    >>> resolve('memory_measure', kind='function')
+    <function memory_measure at 0x7f...>
+    """
+    try:
+        return _resolved[kind, name]
+    except KeyError:
+        pass
+
+    if name in _builtin[kind]:
+        function = _builtin[kind][name]
+    elif name in _registry:
+        function = _registry[name]
+    else:
+        function = user_function(name)
+    if not callable(function):
+        raise NameError("'{0}' is not a function".format(name))
+
+    _resolved[kind, name] = function
+    _names.setdefault(function, name)
+    return function
+
+
+def name_of(function: 'function', kind: str='operator') -> str:
+    """
+    Return name under which function can be resolved, or None.
+
+    Examples
+    --------
+    >>> name_of(safemax)
+    'safemax'
+    """
+    if function is None or function == '':
+        return None
+    if function in _names:
+        return _names[function]
+    for name, candidate in _builtin[kind].items():
+        if candidate is function:
+            return name
+    name = getattr(function, '__name__', None)
+    try:
+        if name and resolve(name, kind) is function:
+            return name
+    except NameError:
+        pass
+    return None
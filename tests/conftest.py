@@ -0,0 +1,20 @@
+# conftest.py
+#
+# The modules of mgproc import each other by their plain names, so the
+# package folder has to be on the path; the tests are run from it so that
+# the relative paths to trees, metrics, and comparisons work.
+
+import os
+import sys
+
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
+
+
+@pytest.fixture(autouse=True)
+def package_dir(monkeypatch):
+    monkeypatch.chdir(PACKAGE_DIR)
+    return PACKAGE_DIR
@@ -0,0 +1,48 @@
+# Tests for resumable sweeps (cli.run_sweep).
+
+import os
+import shutil
+
+import pytest
+
+import cli
+
+
+SWEEP = {'compare': './comparisons/rc_prom/SRC-ORC',
+         'metrics': './metrics/base',
+         'ranks': 2,
+         'directory': './trees/rc_prom',
+         'shard_size': 50}
+
+
+def test_resume_after_lost_shard_files(tmp_path, capsys):
+    output = str(tmp_path / 'sweep.csv')
+    full = cli.run_sweep(output=output, **SWEEP)
+    assert sum(full.values()) == 20 ** 2
+    with open(output, 'r') as f:
+        table = f.read()
+
+    # lose some shard files, as if the run had crashed before writing them
+    checkpoint = output + '.checkpoint'
+    for number in [0, 3, 7]:
+        os.remove(cli._shard_file(checkpoint, number))
+
+    assert cli.run_sweep(output=output, **SWEEP) == full
+    with open(output, 'r') as f:
+        assert f.read() == table
+    assert 'Resuming from checkpoint: 5 of 8 shards done' in\
+        capsys.readouterr().out
+
+    # a finished sweep is not run again
+    assert cli.run_sweep(output=output, **SWEEP) == full
+
+
+def test_checkpoint_of_other_tree_directory_is_rejected(tmp_path):
+    output = str(tmp_path / 'sweep.csv')
+    cli.run_sweep(output=output, **SWEEP)
+
+    # the same trees copied elsewhere may have been annotated differently
+    copy = tmp_path / 'trees'
+    shutil.copytree(SWEEP['directory'], str(copy))
+    with pytest.raises(Exception, match='belongs to a different sweep'):
+        cli.run_sweep(output=output, **dict(SWEEP, directory=str(copy)))
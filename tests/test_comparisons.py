@@ -0,0 +1,106 @@
+# Tests for ComparisonSet (comparisons.py).
+
+import pytest
+
+from comparisons import comparisons_from_file, Comparison, ComparisonSet
+from metrics import base_metrics_from_file, _construct_ranked_metric,\
+    SUCCESS
+
+
+def _sweep(compare: str='./comparisons/rc_prom/AllSingleRCs',
+           directory: str='./trees/rc_prom', ranks: int=2,
+           compact: bool=False) -> 'ComparisonSet':
+    base_metrics = base_metrics_from_file('./metrics/base')
+    metrics = _construct_ranked_metric(base_metrics, ranks, compact=compact)
+    return comparisons_from_file(compare, directory=directory,
+                                 metrics=metrics)
+
+
+def _results(comp: 'ComparisonSet') -> dict:
+    """Results by metric id, so that different metric objects can be compared"""
+    return {subtype: sorted(comp._metric_id(metric)
+                            for metric in getattr(comp, subtype))
+            for subtype in ['success', 'tie', 'failure']}
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_early_exit_matches_full_compare(compact):
+    full = _sweep(compact=compact)
+    comp = _sweep(compact=compact)
+    comp.compare(early_exit=True)
+
+    assert comp.skipped > 0
+    assert _results(comp) == _results(full)
+
+
+def test_early_exit_stops_once_every_metric_has_failed():
+    comp = _sweep(compare='./comparisons/rc_prom/SRC-ORC')
+    comparison = comp.comparisons[0]
+    # metrics that capture the contrast fail its reverse
+    failing = _construct_ranked_metric(
+        base_metrics_from_file('./metrics/base'), 2)
+    failing = [metric for metric, old in zip(failing, comp.metrics)
+               if old.outcome(comparison.name) == SUCCESS]
+
+    # the reverse contrast twice, each with the metrics as fallback
+    reverse = ComparisonSet([], metrics=failing)
+    for name in ['first', 'second']:
+        reverse.add(Comparison(name=name, winner=comparison.loser,
+                               loser=comparison.winner, metrics=failing))
+    reverse.compare(early_exit=True)
+
+    assert reverse.failure == set(failing)
+    assert reverse.skipped == len(failing)
+    tested = [name for name in ['first', 'second']
+              if any(name in metric.profile for metric in failing)]
+    assert len(tested) == 1
+
+
+def test_tally_ignores_comparisons_of_other_sets():
+    base_metrics = base_metrics_from_file('./metrics/base')
+    shared = _construct_ranked_metric(base_metrics, 1)
+    first = comparisons_from_file('./comparisons/rc_prom/SRC-ORC',
+                                  directory='./trees/rc_prom',
+                                  metrics=shared)
+    second = comparisons_from_file('./comparisons/rc_prom/Stacked-RCs',
+                                   directory='./trees/rc_prom',
+                                   metrics=shared)
+    first.compare()
+
+    alone = _sweep(compare='./comparisons/rc_prom/SRC-ORC', ranks=1)
+    assert _results(first) == _results(alone)
+    assert _results(second) ==\
+        _results(_sweep(compare='./comparisons/rc_prom/Stacked-RCs',
+                        ranks=1))
+
+
+def test_merge_of_halves_matches_full_compare():
+    base_metrics = base_metrics_from_file('./metrics/base')
+    metrics = _construct_ranked_metric(base_metrics, 2)
+    first = comparisons_from_file('./comparisons/rc_prom/AllSingleRCs',
+                                  directory='./trees/rc_prom',
+                                  metrics=metrics[:200])
+    second = comparisons_from_file('./comparisons/rc_prom/AllSingleRCs',
+                                   directory='./trees/rc_prom',
+                                   metrics=metrics[200:])
+    full = _sweep()
+
+    assert _results(first.merge(second)) == _results(full)
+
+
+def test_merge_puts_every_metric_in_one_group():
+    comp = _sweep(compare='./comparisons/rc_prom/SRC-ORC', ranks=1)
+    # same Comparison names, but with winner and loser swapped
+    other = _sweep(compare='./comparisons/rc_prom/SRC-ORC', ranks=1)
+    for comparison in other.comparisons:
+        comparison.winner, comparison.loser =\
+            comparison.loser, comparison.winner
+        comparison.reset()
+    other.compare()
+
+    comp.merge(other)
+    for comparison in comp.comparisons:
+        groups = [comparison.success, comparison.tie, comparison.failure]
+        for metric in comp.metrics:
+            assert sum(metric in group for group in groups) == 1
+            assert metric in groups[2 - metric.outcome(comparison.name)]
@@ -0,0 +1,66 @@
+# Tests for the vectorized engine (engine.py) against the Python path
+# (Comparison.compare).
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+import engine
+from comparisons import comparisons_from_file
+from metrics import base_metrics_from_file, _construct_ranked_metric
+
+
+COMPARISONS = [('./comparisons/rc_prom/SRC-ORC', './trees/rc_prom'),
+               ('./comparisons/rc_prom/AllSingleRCs', './trees/rc_prom'),
+               ('./comparisons/rc_wh/Stacked-RCs', './trees/rc_wh')]
+
+
+def test_encode_lists_preserves_order_of_nested_lists():
+    values = [[[2, 1]], [[2]], [], [[]], [[2, 1], []], [[3]], [[2], [1]]]
+    encoded = engine.encode_lists(values)
+    for first, row1 in zip(values, encoded):
+        for second, row2 in zip(values, encoded):
+            assert (first < second) == (tuple(row1) < tuple(row2))
+            assert (first == second) == (tuple(row1) == tuple(row2))
+
+
+@pytest.mark.parametrize('compare, directory', COMPARISONS)
+@pytest.mark.parametrize('ranks', [1, 2])
+@pytest.mark.parametrize('ranked', [False, True])
+def test_outcomes_match_compare(compare, directory, ranks, ranked):
+    base_metrics = base_metrics_from_file('./metrics/base')
+    metrics = _construct_ranked_metric(base_metrics, ranks)
+    comp = comparisons_from_file(compare, directory=directory,
+                                 metrics=metrics)
+    if ranked:
+        # RankedMetrics of rank 1 have nested list values for metrics
+        # with operator sorted, e.g. [[21, 21, 7, 6, 6]]
+        base_metrics = _construct_ranked_metric(base_metrics, 1)
+
+    expected = [[metric.outcome(comparison.name)
+                 for comparison in comp.comparisons]
+                for metric in metrics]
+    codes = engine.outcomes(comp, base_metrics, ranks=ranks, chunk_size=37)
+    assert codes.tolist() == expected
+
+    tally = engine.tally(comp, base_metrics, ranks=ranks)
+    for subtype in ['success', 'tie', 'failure']:
+        assert {metrics[number] for number in tally[subtype]} ==\
+            getattr(comp, subtype)
+
+
+@pytest.mark.parametrize('container', [list, set])
+def test_top_margins_of_metric_set(container):
+    base_metrics = base_metrics_from_file('./metrics/base')
+    metrics = _construct_ranked_metric(base_metrics, 2)
+    comp = comparisons_from_file('./comparisons/rc_prom/SRC-ORC',
+                                 directory='./trees/rc_prom',
+                                 metrics=container(metrics))
+
+    best = comp.top_margins(k=5)
+    expected = sorted((margin for _, margin in
+                       comp.top_margins(k=5, base_metrics=base_metrics,
+                                        ranks=2)), reverse=True)
+    assert len(best) == 5
+    assert all(metric in metrics for metric, _ in best)
+    assert sorted((margin for _, margin in best), reverse=True) == expected
@@ -0,0 +1,48 @@
+# Tests for memory accounting (footprint.py).
+
+import pytest
+
+from comparisons import comparisons_from_file
+from footprint import estimate, footprint
+from metrics import base_metrics_from_file, ranked_metrics
+
+
+COMPARE = './comparisons/rc_prom/AllSingleRCs'
+DIRECTORY = './trees/rc_prom'
+
+# the estimate is used to size shards, so it must stay close to the
+# measured footprint in both directions
+TOLERANCE = 0.25
+
+
+@pytest.mark.parametrize('compact', [True, False])
+@pytest.mark.parametrize('metric_file, ranks', [('./metrics/base', 1),
+                                                ('./metrics/base', 2),
+                                                ('./metrics/filtered', 1),
+                                                ('./metrics/filtered', 2)])
+def test_estimate_matches_footprint(metric_file, ranks, compact):
+    base_metrics = base_metrics_from_file(metric_file)
+    comp = comparisons_from_file(COMPARE, directory=DIRECTORY)
+    comp.metrics = list(ranked_metrics(base_metrics, ranks=ranks,
+                                       compact=compact))
+    comp.compare()
+
+    trees = {id(tree): tree for tree in comp.trees(update=True)}
+    nodes = sum(len(tree.struct) for tree in trees.values()) // len(trees)
+    measured = footprint(comp)
+    estimated = estimate(len(base_metrics), ranks, len(comp.comparisons),
+                         compact=compact, trees=len(trees), nodes=nodes)
+
+    assert estimated['count'] == len(comp.metrics)
+    # trees and nodes used to be left out of the estimate
+    assert estimated['trees'] > 0 and estimated['nodes'] > 0
+    assert abs(estimated['total'] - measured['total']) <=\
+        TOLERANCE * measured['total']
+
+
+def test_footprint_is_reproducible():
+    base_metrics = base_metrics_from_file('./metrics/base')
+    comp = comparisons_from_file(COMPARE, directory=DIRECTORY)
+    comp.metrics = list(ranked_metrics(base_metrics, ranks=2, compact=True))
+    comp.compare()
+    assert footprint(comp) == footprint(comp)
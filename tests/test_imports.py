@@ -0,0 +1,52 @@
+# Import smoke tests for the package as a whole.
+#
+# Each import runs in a fresh interpreter, since the package puts its own
+# folder on the path and the modules are cached under their plain names.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import PACKAGE_DIR
+
+
+def _import(tmp_path, name: str, code: str):
+    os.symlink(PACKAGE_DIR, str(tmp_path / name))
+    return subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+@pytest.mark.parametrize('name', ['mgproc', 'mgproc_checkout'])
+def test_package_import(tmp_path, name):
+    code = '\n'.join(['import {0} as package'.format(name),
+                      'package.tree_from_file',
+                      'package.trees_from_folder',
+                      'package.comparisons_from_file',
+                      'package.metrics_from_file',
+                      'package.evaluate_sharded',
+                      'print(package.tree_files.__name__)'])
+    result = _import(tmp_path, name, code)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'tree_files'
+
+
+def test_package_import_is_lazy(tmp_path):
+    code = '\n'.join(['import sys',
+                      'import mgproc',
+                      "print('comparisons' in sys.modules)"])
+    result = _import(tmp_path, 'mgproc', code)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'False'
+
+
+def test_flat_module_import():
+    result = subprocess.run(
+        [sys.executable, '-c',
+         'from mgproc import tree_from_file\n'
+         'from comparisons import comparisons_from_file'],
+        cwd=PACKAGE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    assert result.returncode == 0, result.stderr
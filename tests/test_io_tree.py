@@ -0,0 +1,28 @@
+# Tests for lazy IOTrees (io_tree.py).
+
+import glob
+
+import pytest
+
+from metrics import base_metrics_from_file
+from tree_files import tree_from_file
+from tree_values import typedict
+
+
+TREES = sorted(glob.glob('./trees/*.tree.forest') +
+               glob.glob('./trees/*/*.tree.forest'))
+
+
+@pytest.mark.parametrize('path', TREES)
+def test_lazy_tree_matches_eager_tree(path):
+    eager = tree_from_file(path)
+    lazy = tree_from_file(path, lazy=True)
+
+    # status is available before the annotation has been computed
+    assert [typedict(node) for node in lazy.struct.values()] ==\
+        [typedict(node) for node in eager.struct.values()]
+    assert not lazy._parsed
+
+    for base_metric in base_metrics_from_file('./metrics/base'):
+        assert base_metric.eval(lazy) == base_metric.eval(eager)
+    assert lazy.tenures == eager.tenures
@@ -0,0 +1,93 @@
+# Tests for sharded evaluation (jobs.evaluate_sharded).
+
+import pytest
+
+import jobs
+from comparisons import comparisons_from_file
+from metrics import base_metrics_from_file, _construct_ranked_metric
+
+
+COMPARE = './comparisons/rc_prom/AllSingleRCs'
+DIRECTORY = './trees/rc_prom'
+
+
+def _results(comp: 'ComparisonSet') -> dict:
+    results = {'metrics': [comp._metric_id(metric) for metric in comp.metrics],
+               'rows': [tuple(row) for row in comp._rows()]}
+    for subtype in ['success', 'tie', 'failure']:
+        results[subtype] = sorted(comp._metric_id(metric)
+                                  for metric in getattr(comp, subtype))
+        for comparison in comp.comparisons:
+            results[comparison.name, subtype] =\
+                sorted(comp._metric_id(metric)
+                       for metric in getattr(comparison, subtype))
+    return results
+
+
+@pytest.fixture(scope='module')
+def unsharded():
+    metrics = _construct_ranked_metric(
+        base_metrics_from_file('./metrics/base'), 2, compact=True)
+    return comparisons_from_file(COMPARE, directory=DIRECTORY,
+                                 metrics=metrics)
+
+
+def test_shard_ranges():
+    assert jobs.shard_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert jobs.shard_ranges(0, 4) == []
+
+
+@pytest.mark.parametrize('options', [{'shard_size': 37},
+                                     {'shard_size': 1000},
+                                     {'budget': 2**16},
+                                     {'shard_size': 150, 'workers': 2}])
+def test_sharded_matches_unsharded(unsharded, options):
+    options.setdefault('workers', 1)
+    comp = jobs.evaluate_sharded(COMPARE, './metrics/base', ranks=2,
+                                 directory=DIRECTORY, **options)
+    assert _results(comp) == _results(unsharded)
+
+
+def test_sharded_aggregate_matches_unsharded(unsharded):
+    stats = jobs.evaluate_sharded(COMPARE, './metrics/base', ranks=2,
+                                  directory=DIRECTORY, shard_size=37,
+                                  aggregate=True)
+    expected = unsharded.aggregate(_construct_ranked_metric(
+        base_metrics_from_file('./metrics/base'), 2, compact=True))
+    assert stats.total == expected.total == 400
+    assert stats.overall == expected.overall
+    assert stats.contrasts == expected.contrasts
+    assert stats.base_metrics == expected.base_metrics
+    assert stats.best() == expected.best()
+
+
+def test_sharded_without_metrics():
+    comp = jobs.evaluate_sharded(COMPARE, [], ranks=2, directory=DIRECTORY)
+    assert list(comp.metrics) == []
+
+
+def test_default_outputs_are_distinct():
+    outputs = [job['output'] for job in jobs.jobs_from_file('./jobs/rc')]
+    assert len(set(outputs)) == len(outputs)
+    assert 'rc_prom_Stacked-RCs_filtered_2.org' in outputs
+    assert 'rc_wh_Stacked-RCs_filtered_2.org' in outputs
+
+
+def test_duplicate_outputs_are_rejected(tmp_path):
+    manifest = tmp_path / 'clash.jobs'
+    manifest.write_text('./comparisons/rc_prom/SRC-ORC; ./metrics/base; 1;'
+                        ' ./trees/rc_prom; out.org\n'
+                        './comparisons/rc_wh/SRC-ORC; ./metrics/base; 1;'
+                        ' ./trees/rc_wh; out.org\n')
+    with pytest.raises(Exception, match='both write to'):
+        jobs.jobs_from_file(str(manifest))
+
+    job_list = [jobs._job_from_line('./comparisons/rc_prom/SRC-ORC;'
+                                    ' ./metrics/base; 1; ./trees/rc_prom;'
+                                    ' a/out.org'),
+                jobs._job_from_line('./comparisons/rc_wh/SRC-ORC;'
+                                    ' ./metrics/base; 1; ./trees/rc_wh;'
+                                    ' a/../a/out.org')]
+    with pytest.raises(Exception, match='both write to'):
+        jobs.run_jobs(job_list, workers=1, output_dir=str(tmp_path))
+    assert not (tmp_path / 'a').exists()
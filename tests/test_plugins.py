@@ -0,0 +1,28 @@
+# Tests for the registry of operators and measure functions (plugins.py).
+
+import glob
+
+import pytest
+
+import plugins
+from metrics import base_metrics_from_file
+
+
+@pytest.mark.parametrize('name', ['eval', 'exec', 'open', '__import__',
+                                  'compile', 'getattr', '__builtins__'])
+@pytest.mark.parametrize('kind', ['operator', 'function'])
+def test_python_builtins_are_not_resolved(name, kind):
+    with pytest.raises(NameError):
+        plugins.resolve(name, kind)
+
+
+@pytest.mark.parametrize('name', ['safemax', 'avg', 'sum', 'len', 'sorted',
+                                  'reverse_sorted', 'min', 'max'])
+def test_operators_are_resolved(name):
+    assert callable(plugins.resolve(name))
+    assert plugins.name_of(plugins.resolve(name)) == name
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob('./metrics/*.metrics')))
+def test_shipped_metric_files_resolve(path):
+    assert base_metrics_from_file(path)
@@ -0,0 +1,72 @@
+# Tests for reading trees from files (tree_files.py).
+
+import os
+
+import pytest
+
+import tree_files
+from tree_files import tree_from_file, trees_from_folder
+
+
+FOLDERS = ['./trees/rc_prom', './trees/rc_wh', './trees/scope',
+           './trees/examples']
+
+
+@pytest.mark.parametrize('directory', FOLDERS)
+def test_folder_matches_single_trees(directory):
+    trees = trees_from_folder(directory)
+    names = sorted(name[:-len('.tree.forest')]
+                   for name in os.listdir(directory)
+                   if name.endswith('.tree.forest'))
+    assert sorted(tree.name for tree in trees) == names
+
+    for tree in trees:
+        for workers in [1, 3]:
+            single = tree_from_file(os.path.join(directory, tree.name),
+                                    workers=workers)
+            assert single.name == tree.name
+            assert single.print() == tree.print()
+            assert single.movement == tree.movement
+
+
+def test_folder_from_other_directory(tmp_path, monkeypatch):
+    directory = os.path.abspath('./trees/examples')
+    monkeypatch.chdir(str(tmp_path))
+    assert len(trees_from_folder(directory)) == 2
+
+
+def test_missing_tree_file():
+    with pytest.raises(FileNotFoundError):
+        tree_from_file('./trees/examples/missing')
+
+
+def test_unreadable_tree_file_in_folder(monkeypatch):
+    read_text = tree_files._read_text
+
+    def unreadable(path):
+        if path.endswith('ugly.tree.forest'):
+            return None
+        return read_text(path)
+
+    monkeypatch.setattr(tree_files, '_read_text', unreadable)
+    with pytest.raises(FileNotFoundError):
+        trees_from_folder('./trees/examples')
+
+
+def test_export_reruns_when_options_change(tmp_path):
+    output_dir = str(tmp_path)
+    folder = './trees/rc_prom'
+    first = tree_files.export_folder(folder, output_dir=output_dir,
+                                     arcs='tree', workers=1)
+    assert first
+    assert tree_files.export_folder(folder, output_dir=output_dir,
+                                    arcs='tree', workers=1) == []
+
+    # same output files, but different arcs: everything is written again
+    assert tree_files.export_folder(folder, output_dir=output_dir,
+                                    arcs='file', workers=1) == first
+    assert tree_files.export_folder(folder, output_dir=output_dir,
+                                    arcs='file', workers=1) == []
+    assert tree_files.export_folder(folder, output_dir=output_dir,
+                                    arcs='tree', workers=1,
+                                    force=True) == first
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# This file defines the functions for working with tree text files.
+#
+# It used to be mgproc.py, but a module of that name is hidden by the
+# package itself once the package is imported as mgproc; mgproc.py now
+# just re-exports the functions defined here.
+#
+# The overall structure of the package is as follows:
+#
+# mgproc
+#   tree_files
+#       metrics
+#           io_tree
+#               gorn_tree
+#               helpers
+#           tree_values
+#   comparisons
+
+import concurrent.futures
+import json
+import re
+import os
+
+from io import StringIO
+
+from metrics import MetricTree
+from helpers import ioprint, texprint
+
+
+def _raw_tokenize(string: str) -> list:
+    """Convert string to list of tokens, breaking after [ and ]"""
+    return re.split('([\[\]])', string)
+
+
+def _strip_comments(string: str, sep='%') -> str:
+    """Delete string suffix after first comment marker"""
+    return string.split(sep, 1)[0]
+
+
+def _tokenize(string: str) -> list:
+    """Tokenizer for forest files"""
+    return [_strip_comments(item)
+            for item in map(str.strip, _raw_tokenize(string))
+            if _strip_comments(item) != '']
+
+
+def _extract_properties(string: str, address: str) -> tuple:
+    """
+    Convert forest string to Gorn node specification.
+
+    Parameters
+    ----------
+    string: str
+        line from forest file to be processed
+    address: str
+        Gorn address of Gorn node to be constructed
+
+    Output
+    ------
+    Dictionary of the form
+
+    {'address': str, Gorn address
+     'label': str, label of node
+     'name': str, tikz name of node
+     'empty': bool, (un)pronounced node
+     'content': bool, (non)content node
+    }
+
+    Examples
+    --------
+    >>> extract_properties('[Aux, empty, name=embedded', '201')
+    {'address': '201', 'label': Aux, 'name': 'embedded',
+     'empty': True, 'content': }
+    """
+    # label is string of word characters, including -, \, {, }, and .
+    label = re.match(r'\s*([\w$\'\-\\{}\.]*)', string).group(1)
+    # do we have "empty" after a comma somewhere in the string?
+    empty = True if re.search(r',\s*empty\W*', string) else None
+    # do we have "content" after a comma somewhere in the string?
+    content = True if re.search(r',\s*content\W*', string) else None
+    # do we have a string immedidately preceded by "name = "?
+    name_match = re.search(r',\s*name\s*=\s*([\w\-\']*)', string)
+    if name_match:
+        name = name_match.group(1)
+    else:
+        name = None
+
+    return {'address': address, 'label': label,
+            'name': name, 'empty': empty, 'content': content}
+
+
+def parse(string: str) -> list:
+    """
+    Convert forest tree to tuples for a GornTree.
+
+    Takes a string that specifies a tree in the notation of the
+    LaTeX forest package. It produces a list of tuples that each
+    specify a GornNode.
+
+    Examples
+    --------
+    >>> parse('[S\n [NP [John, name=subject]]\n
+               [Aux, empty] [VP [slept, name=verb]]')
+    [('', 'S'), ('1', 'NP), ('11', 'John', 'subject'),
+     ('2', 'Aux', None, True), ('3', 'VP'), ('31', 'slept', 'verb')]
+    """
+    tree = []
+    tokens = _tokenize(string)
+    # infer Gorn address of node in token from bracketing
+    for pos in range(len(tokens)):
+        # root node
+        if tokens[pos] == '[' and pos == 0:
+            address = ''
+        # descend into a subtree with left siblings
+        elif tokens[pos] == '[' and tokens[pos-1] == ']':
+            address = address[:-1] + str(int(address[-1]) + 1)
+        # descend into a subtree without left siblings
+        elif tokens[pos] == '[':
+            address = address + '1'
+        # descend out of rightmost sibling
+        elif tokens[pos] == ']' and tokens[pos-1] == ']':
+            address = address[:-1]
+        # looking at a node
+        elif tokens[pos] != ']':
+            tree.append(_extract_properties(tokens[pos], address))
+    return tree
+
+
+def _read_text(path: str) -> str:
+    """Read file, or return None if it does not exist or is not readable"""
+    try:
+        with open(path, 'r') as textfile:
+            return textfile.read()
+    except IOError:
+        return None
+
+
+def _read_triplets(inputfiles: list, extension: str='.tree.forest',
+                   workers: int=3, existing: set=None) -> list:
+    """
+    Read forest, linearization, and move files of trees.
+
+    All files are read with a bounded pool of threads, so that the latency of
+    slow (e.g. network-mounted) file systems is not paid once per file. If
+    existing is specified, only files whose paths are in it are read, and all
+    others are taken to be missing without opening them.
+
+    Returns
+    -------
+    list
+        (forest, linearization, move) texts for each inputfile;
+        missing files are None
+    """
+    paths = [inputfile + suffix
+             for inputfile in inputfiles
+             for suffix in [extension, '.linear', '.move.forest']]
+    if existing is not None:
+        read = lambda path: _read_text(path) if path in existing else None
+    else:
+        read = _read_text
+
+    if workers == 1 or len(paths) < 2:
+        texts = [read(path) for path in paths]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers) as pool:
+            texts = list(pool.map(read, paths))
+    return [tuple(texts[pos:pos + 3]) for pos in range(0, len(texts), 3)]
+
+
+def _linearization_from_text(text: str) -> list:
+    """Convert content of *.linear file to linearization specification"""
+    return [line.split(';') for line in StringIO(text).readlines()]
+
+
+def _linearization_from_file(inputfile) -> list:
+    """Convert *.linear file to linearization specification"""
+    with open(inputfile, 'r') as linearization:
+        return _linearization_from_text(linearization.read())
+
+
+def _move_from_text(text: str) -> list:
+    """Convert content of *.move.forest file to movement specification"""
+    movement = []
+    for line in StringIO(text).readlines():
+        # match all (...) in line
+        # fixme: ignore stuff after last . so that we can use anchors like .south
+        move = re.findall(r'\((.*?)\)', line)
+        # feature as specified by move={f}
+        feat = re.match(r'.*move\s*=\s*{([^}]*)}.*', line)
+        # append first (...), last (...), and feature type
+        movement.append((move[0], move[-1], feat.group(1)))
+    return movement
+
+
+def tree_from_text(tree: str, linear: str=None, move: str=None,
+                   name: str='', autolinearize: bool=False,
+                   lazy: bool=False, check: bool=True) -> 'MetricTree':
+    """
+    Construct MetricTree from the contents of forest & linearization files.
+
+    Parameters
+    ----------
+    tree: str
+        content of foo.tree.forest
+    linear: str
+        content of foo.linear; if None, leaf nodes are linearized
+        automatically
+    move: str
+        content of foo.move.forest; if None, the tree has no movers
+    name: str
+        name of the tree
+    autolinearize: str
+        ignore linear and linearize leaf nodes automatically
+    lazy: bool
+        defer index/outdex annotation until it is needed (see IOTree)
+    check: bool
+        check consistency of the tree before annotating it
+
+    Examples
+    --------
+    >>> tree = tree_from_text('[C [D] [E]]', name='small')
+    """
+    # linearize automatically or...
+    if autolinearize or linear is None:
+        tree = MetricTree(*parse(tree), name=name,
+                          lazy=lazy, check=check)
+    # ... according to linearization file
+    else:
+        leaf_order = [int(address)
+                      for label, address in
+                      _linearization_from_text(linear)]
+        tree = MetricTree(*parse(tree), leaf_order=leaf_order, name=name,
+                          lazy=lazy, check=check)
+
+    # then add Move information
+    if move is not None:
+        tree.add_movers(_move_from_text(move))
+
+    # and return fully built tree
+    return tree
+
+
+def tree_from_file(inputfile: str=None,
+                   extension: str='.tree.forest',
+                   autolinearize: bool=False,
+                   lazy: bool=False, check: bool=True,
+                   workers: int=1) -> 'MetricTree':
+    """
+    Construct MetricTree from forest & linearization files.
+
+    This function presupposes that a tree *foo* has already been specified via
+    three files:
+
+    - foo.tree.forest: forest file for foo, without any movement
+    - foo.move.forest: move arcs for foo as tikz draw commands
+    - foo.linear: linearly ordered list of leaf nodes;
+                  one line per "node; Gorn address" pair
+
+    Each file is opened only once, and all three are read before the tree
+    is built from their contents (see tree_from_text).
+
+    Parameters
+    ----------
+    inputfile: str
+        path to foo.tree.forest (file extension can be omitted);
+        if none is specified, we explicitly ask the user
+    extension: str
+        default file extension for forest files
+    autolinearize: str
+        should the linearization of leaf nodes be computed automatically?
+        if false, make sure a linearization file exists
+    lazy: bool
+        defer index/outdex annotation until it is needed (see IOTree)
+    check: bool
+        check consistency of the tree before annotating it
+    workers: int
+        number of threads reading the files; by default, the files are
+        read one after the other, which is fastest on local disks
+    """
+    # ask for input file if necessary
+    if not inputfile:
+        inputfile =\
+            input("File to read in\
+                  (without {0} extension):\n".format(extension))
+
+    # remove extension if user included it in path
+    if inputfile.endswith(extension):
+        inputfile = inputfile.replace(extension, '')
+
+    tree, linear, move = _read_triplets([inputfile], extension,
+                                        workers=workers)[0]
+    if tree is None:
+        raise FileNotFoundError(inputfile + extension)
+    return tree_from_text(tree, linear, move,
+                          name=os.path.basename(inputfile),
+                          autolinearize=autolinearize,
+                          lazy=lazy, check=check)
+
+
+def trees_from_folder(directory: str=None,
+                      extension: str='.tree.forest',
+                      autolinearize: bool=False,
+                      lazy: bool=False, check: bool=True,
+                      workers: int=8):
+    """
+    Batch create trees from files in a folder.
+
+    Given a path to a directory, run tree_from_file for each tree specified in
+    the folder.  As in tree_from_file, we presuppose that a tree *foo* has
+    already been specified via three files:
+
+    - foo.tree.forest: forest file for foo, without any movement
+    - foo.move.forest: move arcs for foo as tikz draw commands
+    - foo.linear: linearly ordered list of leaf nodes;
+                  one line per "node; Gorn address" pair
+
+    The folder is listed only once, so missing files are never opened, and
+    the files of all trees are read concurrently before any tree is built.
+
+    Parameters
+    ----------
+    inputfile: str
+        path to folder containing the .tree.forest-files; 
+        if none is specified, we explicitly ask the user
+    extension: str
+        default file extension for forest files
+    autolinearize: str
+        should the linearization of leaf nodes be computed automatically?
+        if false, make sure a linearization file exists for each tree
+    lazy: bool
+        defer index/outdex annotation of each tree until it is needed
+    check: bool
+        check consistency of each tree before annotating it
+    workers: int
+        maximum number of threads reading files at the same time
+    """
+    if not directory:
+        directory = input("Enter folder to be processed \
+(relative to current working directory):\n")
+
+    # list of trees (= list of *.tree.forest with extension stripped)
+    paths = [entry.path for entry in os.scandir(directory)
+             if entry.is_file()]
+    files = [tree_file[:-len(extension)]
+             for tree_file in paths
+             if tree_file.endswith(extension)]
+
+    trees = []
+    for basename, (tree, linear, move) in zip(
+            files, _read_triplets(files, extension, workers=workers,
+                                  existing=set(paths))):
+        if tree is None:
+            raise FileNotFoundError(basename + extension)
+        trees.append(tree_from_text(tree, linear, move,
+                                    name=os.path.basename(basename),
+                                    autolinearize=autolinearize,
+                                    lazy=lazy, check=check))
+    return trees
+
+
+def check_order(tree: 'IOTree', specification: 'linearization file') -> bool:
+    """
+    Check *.linear files for consistency with *.tree.forest
+
+    Since *.linear files are created semi-automatically, there is a risk of
+    user error. This function checks for each address in *.linear that it
+    has the same label in the tree as specified in *.linear.
+
+    Parameters
+    ----------
+    tree: IOTree
+        IOTree which we should compare the *.linear file against
+    specification: str
+        path to *.linear file
+    """
+    for label, address in _linearization_from_file(specification + '.linear'):
+        # sanitize address (remove \n, whitespace);
+        # fails for address '', but root should never be leaf anyways
+        address = str(int(address))
+        label_in_tree = tree.struct[address].label()
+        if label != label_in_tree:
+            print('Label mismatch: address {1} has label {2}, not {0}'.format(
+                label, address, label_in_tree))
+            return False
+        return True
+
+
+# file in the output folder that records the options of every export
+_manifest = '.mgproc-export.json'
+
+
+def _sources(inputfile: str, extension: str='.tree.forest') -> list:
+    """List existing source files of tree inputfile (without extension)"""
+    return [source for source in [inputfile + extension,
+                                  inputfile + '.linear',
+                                  inputfile + '.move.forest']
+            if os.path.exists(source)]
+
+
+def _load_manifest(output_dir: str) -> dict:
+    """Load options of earlier exports to output_dir, if any"""
+    try:
+        with open(os.path.join(output_dir, _manifest), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir: str, manifest: dict):
+    """Atomically write options of exports to output_dir"""
+    path = os.path.join(output_dir, _manifest)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _export_tree(inputfile: str, output: str, extension: str='.tree.forest',
+                 io: bool=True, arcs: str='tree') -> str:
+    """Build tree from its source files and write its forest code to output"""
+    tree = tree_from_file(inputfile, extension=extension)
+    # write to a temporary file first so that an interrupted export
+    # never leaves a truncated file that looks up to date
+    with open(output + '.tmp', 'w', buffering=1 << 16) as handle:
+        texprint(tree, tree_directory=os.path.dirname(inputfile),
+                 io=io, handle=handle, arcs=arcs)
+        handle.write('\n')
+    os.replace(output + '.tmp', output)
+    return output
+
+
+def export_folder(path: str, output_dir: str=None,
+                  extension: str='.tree.forest', io: bool=True,
+                  arcs: str='tree', workers: int=None,
+                  force: bool=False) -> list:
+    """
+    Batch export forest code for all trees in a folder.
+
+    For every tree foo in path, the complete forest code produced by
+    texprint is written to foo.io.mgproc.forest (or foo.mgproc.forest if
+    io=False) in output_dir. Each tree is built only once, and trees are
+    exported in parallel. A tree is skipped if its output file is newer than
+    all of its source files (foo.tree.forest, foo.linear, foo.move.forest)
+    and was written with the same options. The options of every output
+    file are recorded in .mgproc-export.json in output_dir.
+
+    Parameters
+    ----------
+    path: str
+        folder containing the .tree.forest-files
+    output_dir: str
+        folder for output files; defaults to path
+    extension: str
+        default file extension for forest files
+    io: bool
+        add code for index/outdex annotation?
+    arcs: str
+        tree: build move arcs from the trees; file: copy them from the
+        *.move.forest files (see texprint)
+    workers: int
+        number of worker processes; by default, one per CPU;
+        with workers=1, all trees are exported in the current process
+    force: bool
+        export all trees, even if their output files are up to date
+
+    Returns
+    -------
+    list
+        paths of all files that have been written
+
+    Examples
+    --------
+    >>> export_folder('./trees/rc_wh', output_dir='./img', workers=4)
+    """
+    if not output_dir:
+        output_dir = path
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = ('.io' if io else '') + '.mgproc.forest'
+    manifest = _load_manifest(output_dir)
+
+    tasks = []
+    for tree_file in sorted(os.listdir(path)):
+        if not tree_file.endswith(extension):
+            continue
+        basename = tree_file[:-len(extension)]
+        inputfile = os.path.join(path, basename)
+        output = os.path.join(output_dir, basename + suffix)
+        options = {'source': os.path.abspath(inputfile),
+                   'extension': extension, 'io': io, 'arcs': arcs}
+
+        if not force and os.path.exists(output) and\
+                manifest.get(basename + suffix) == options:
+            changed = max(os.path.getmtime(source)
+                          for source in _sources(inputfile, extension))
+            if os.path.getmtime(output) >= changed:
+                continue
+        tasks.append(((inputfile, output, extension, io, arcs), options))
+
+    if not tasks:
+        return []
+    # forget the options of files about to be rewritten first, so that an
+    # interrupted export never leaves a file recorded with the wrong options
+    for task, options in tasks:
+        manifest.pop(os.path.basename(task[1]), None)
+    _save_manifest(output_dir, manifest)
+
+    if workers == 1 or len(tasks) < 2:
+        written = [_export_tree(*task) for task, options in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers) as pool:
+            futures = [pool.submit(_export_tree, *task)
+                       for task, options in tasks]
+            written = [future.result() for future in futures]
+
+    for task, options in tasks:
+        manifest[os.path.basename(task[1])] = options
+    _save_manifest(output_dir, manifest)
+    return written
+
+
+def process_folder(path: str=None, extension: str='.tree.forest'):
+    """
+    Batch create trees from files in a folder and print their forest specification.
+
+    This function allows you to i/o-annotate every tree in a folder and print
+    all the information about each tree to the Python shell. To just produce
+    the forest files for a whole folder, use export_folder instead.
+    """
+    if not path:
+        path = input("Enter folder to be processed \
+(relative to current working directory):\n")
+
+    for tree_file in os.listdir(path):
+        # only work on files that end in .tree.forest
+        if tree_file.endswith(extension):
+            basename = tree_file.replace(extension, '')
+            current_file = os.path.join(path, basename)
+            current_tree = tree_from_file(inputfile=current_file,
+                                          autolinearize=False)
+            current_tree.show()
+            ioprint(current_tree, filename=basename, directory=path)
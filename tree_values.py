@@ -25,6 +25,8 @@
 # they are not prefixed with _ so that the user can easily reference them
 # in text files to define various metrics.
 
+import heapq
+
 from io_tree import IONode, IOTree
 
 
@@ -53,6 +55,11 @@ def avg(int_list: list) -> float:
     return safediv(sum(int_list), len(int_list))
 
 
+def reverse_sorted(int_list: list) -> list:
+    """Sort list of integers from largest to smallest."""
+    return sorted(int_list, reverse=True)
+
+
 ########################
 #  Matching Functions  #
 ########################
@@ -169,11 +176,79 @@ def tenure_extract(IOTree, filters: list=[], trivial: bool=False) -> dict:
     >>> tenure_extract(tree, filters=['I', 'P'], trivial=True)
     {}
     """
+    IOTree.ensure_parsed()
     threshold = 2 if not trivial else 0
     return {node.address: node.tenure() for node in IOTree.struct.values()
             if not matches_types(node, filters) and node.tenure() > threshold}
 
 
+def tenure_histogram(IOTree) -> dict:
+    """Group the tenure values of all nodes in IOTree by node type.
+
+    Every node falls into exactly one bucket, identified by the sorted tuple
+    of the node types it matches (see typedict), e.g. ('C', 'I'). For each
+    bucket, we store the non-trivial tenure values from largest to smallest
+    together with their sum, and how many nodes have trivial tenure 1 or 2.
+    Since a filter excludes a node iff it lists one of the node's types,
+    the values for any combination of filters can be assembled from the
+    buckets without visiting the nodes again (see memory_measure).
+
+    IOTree.parse stores the histogram of the tree in IOTree.tenures.
+
+    Examples
+    --------
+    >>> tree = tree_from_file('./examples/ugly')
+    >>> tenure_histogram(tree)[('C', 'P')]
+    {'tenures': [3], 'sum': 3, 'trivial': {1: 4, 2: 1}}
+    """
+    histogram = {}
+    for node in IOTree.struct.values():
+        tenure = node.tenure()
+        if tenure is None:
+            continue
+        types = typedict(node)
+        bucket = tuple(sorted(node_type for node_type in types
+                              if types[node_type]))
+        entry = histogram.setdefault(bucket, {'tenures': [], 'sum': 0,
+                                              'trivial': {1: 0, 2: 0}})
+        if tenure > 2:
+            entry['tenures'].append(tenure)
+            entry['sum'] += tenure
+        elif tenure > 0:
+            entry['trivial'][tenure] += 1
+
+    for entry in histogram.values():
+        entry['tenures'].sort(reverse=True)
+    return histogram
+
+
+def _histogram_measure(IOTree, operator: 'function', filters: list=[],
+                       trivial: bool=False) -> 'int/list':
+    """Compute tenure-based value from the tenure histogram of IOTree"""
+    entries = [entry for bucket, entry in IOTree.tenures.items()
+               if not any(node_type in bucket for node_type in filters)]
+    ones = sum(entry['trivial'][1] for entry in entries) if trivial else 0
+    twos = sum(entry['trivial'][2] for entry in entries) if trivial else 0
+
+    if operator is len or operator is sum or operator is avg:
+        count = sum(len(entry['tenures']) for entry in entries) + ones + twos
+        total = sum(entry['sum'] for entry in entries) + ones + 2 * twos
+        if operator is len:
+            return count
+        elif operator is sum:
+            return total
+        return safediv(total, count)
+    elif operator is safemax:
+        largest = [entry['tenures'][0] for entry in entries
+                   if entry['tenures']]
+        if largest:
+            return max(largest)
+        return 2 if twos else 1 if ones else 0
+    else:
+        return list(heapq.merge(*[entry['tenures'] for entry in entries],
+                                reverse=True)) + [2] * twos + [1] * ones
+
+
 def move_length(IOTree, IONode, filters: list=[], trivial: bool=False) -> dict:
     """Compute dict of size values for given IONode in IOTree.
 
@@ -207,23 +282,52 @@ def move_length(IOTree, IONode, filters: list=[], trivial: bool=False) -> dict:
     >>> move_length(tree, node, filters=['nom', 'acc', 'top'], trivial=True)
     {}
     """
+    return dict(_move_steps(IOTree, IONode.address, IONode.movement,
+                            filters, trivial))
+
+
+def _move_steps(IOTree, address: str, movement: dict,
+                filters: list=[], trivial: bool=False) -> 'iterable':
+    """Generate (mover, target, feature), size pairs for a single mover"""
     # only keep non-final movers if trivial is set to True
-    try:
-        final_target = [next(reversed(IONode.movement))]
-    except:
-        final_target = []
-    move_targets = IONode.movement if trivial else final_target
+    if not movement:
+        return
+    targets = movement if trivial else [next(reversed(movement))]
+    index = IOTree.struct[address].index()
+    for target in targets:
+        feature = movement[target]
+        if feature not in filters:
+            yield ((address, target, feature),
+                   abs(index - IOTree.struct[target].index()))
+
 
-    return {(IONode.address, target, IONode.movement[target]):
-            abs(IONode.index() - IOTree.struct[target].index())
-            for target in move_targets
-            if IONode.movement[target] not in filters}
+def move_steps(IOTree, filters: list=[], trivial: bool=False) -> 'iterable':
+    """Generate size values for all movers in IOTree.
+
+    Only the nodes listed in the mover index IOTree.movement are visited,
+    rather than every node of the tree. See move_length for the format of
+    the generated (key, value) pairs.
+
+    Parameters
+    ----------
+    IOTree : IOTree
+        index/outdex annotated Gorn tree whose size values are to be computed
+    filters: list of str
+        do not consider move steps that were triggered by one of these features
+    trivial : bool
+        whether to consider intermediate movement steps
+    """
+    IOTree.ensure_parsed()
+    for address, movement in IOTree.movement.items():
+        yield from _move_steps(IOTree, address, movement, filters, trivial)
 
 
 def move_extract(IOTree, filters: list=[], trivial: bool=False) -> dict:
     """Compute dict of size values for all nodes in IOTree.
 
     See move_length for details about the format of the dictionary.
+    The dictionary is cached in the IOTree for every combination of filters
+    and trivial, so it must not be modified.
 
     Parameters
     ----------
@@ -249,17 +353,25 @@ def move_extract(IOTree, filters: list=[], trivial: bool=False) -> dict:
     >>> move_extract(tree, filters=['nom', 'hn', 'extra'], trivial=True)
     {}
     """
-    movers = {}
-    for node in IOTree.struct.values():
-        new = move_length(IOTree, node, filters=filters, trivial=trivial)
-        movers.update(new)
-    return movers
+    cache = getattr(IOTree, '_sizes', None)
+    if cache is None:
+        return dict(move_steps(IOTree, filters=filters, trivial=trivial))
+
+    key = (tuple(filters), trivial)
+    if key not in cache:
+        cache[key] = dict(move_steps(IOTree, filters=filters,
+                                     trivial=trivial))
+    return cache[key]
 
 
 ###################
 #  Main Function  #
 ###################
 
+# operators that _histogram_measure knows how to compute
+_histogram_operators = [safemax, sum, len, avg, reverse_sorted]
+
+
 def memory_measure(IOTree,
                    operator: 'function'=None, load_type: str='tenure',
                    filters: list=[], trivial: bool=False) -> 'int/list':
@@ -326,7 +438,15 @@ def memory_measure(IOTree,
     """
     # for recursive metrics, lists should be ordered from largest to smallest
     if not operator or operator == sorted:
-        operator = lambda x: sorted(x, reverse=True)
+        operator = reverse_sorted
+
+    # the standard operators over tenure values can be computed from
+    # the tenure histogram of the tree instead of visiting every node
+    if load_type == 'tenure' and operator in _histogram_operators:
+        IOTree.ensure_parsed()
+        if getattr(IOTree, 'tenures', None) is not None:
+            return _histogram_measure(IOTree, operator,
+                                      filters=filters, trivial=trivial)
 
     if load_type == 'tenure':
         load_type = tenure_extract